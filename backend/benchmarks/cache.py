@@ -0,0 +1,67 @@
+"""
+Benchmark of the cache layer: hit and miss throughput of `Cache.cached` under concurrency.
+
+Usage:
+    python -m benchmarks.cache --backend memory
+    python -m benchmarks.cache --backend redis --near --concurrency 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from core.cache import Cache, DefaultKeyMaker, InMemoryBackend, NearCacheBackend, RedisBackend
+
+
+def make_backend(name: str, near: bool):
+    if name == "memory":
+        return InMemoryBackend()
+    backend = RedisBackend()
+    return NearCacheBackend(backend) if near else backend
+
+
+async def run(args: argparse.Namespace) -> None:
+    Cache.configure(backend=make_backend(args.backend, args.near), key_maker=DefaultKeyMaker())
+    payload = {"id": 1, "name": "benchmark", "tags": list(range(args.payload_size))}
+
+    @Cache.cached(prefix="bench", ttl=600)
+    async def load(item_id: int) -> dict:
+        await asyncio.sleep(args.load_latency / 1000)
+        return {**payload, "id": item_id}
+
+    async def worker(worker_id: int, latencies: list[float]) -> None:
+        for i in range(args.requests):
+            start = time.perf_counter()
+            await load((worker_id * args.requests + i) % args.keys)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    for phase in ("cold", "warm"):
+        latencies: list[float] = []
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w, latencies) for w in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(
+            f"{phase:>4}: {len(latencies) / elapsed:10.0f} ops/s  "
+            f"p50={statistics.median(latencies):.3f}ms  "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1]:.3f}ms"
+        )
+
+    await Cache.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--near", action="store_true", help="Put the in-process near cache in front of Redis")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per worker")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--payload-size", type=int, default=20)
+    parser.add_argument("--load-latency", type=float, default=5.0, help="Simulated recompute latency (ms)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
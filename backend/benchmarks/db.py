@@ -0,0 +1,80 @@
+"""
+Benchmark of query latency with and without the PgBouncer compatibility mode (`SQLALCHEMY_PGBOUNCER`).
+
+Each mode runs the same parametrized query from concurrent workers through an engine configured as the application's
+reader. Without the mode, asyncpg prepares the statement once per connection and reuses it; with it, every execution
+prepares the statement again under a new name, which is the price of running behind PgBouncer in transaction pooling
+mode.
+
+Usage:
+    python -m benchmarks.db
+    python -m benchmarks.db --uri postgresql+asyncpg://app@pgbouncer:6432/waterwise --mode pgbouncer
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from sqlalchemy import text
+
+from core.db.session import EngineType, create_engine
+from core.settings import settings
+
+QUERY = text(
+    "SELECT c.relname, n.nspname, c.reltuples FROM pg_catalog.pg_class c"
+    " JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace"
+    " WHERE c.relkind = 'r' AND c.relpages >= :pages AND c.relname >= :name ORDER BY c.relname LIMIT 10"
+)
+
+
+async def bench(args: argparse.Namespace, pgbouncer: bool) -> None:
+    settings.SQLALCHEMY_PGBOUNCER = pgbouncer
+    settings.SQLALCHEMY_READER_POOL_SIZE = args.pool_size
+    settings.SQLALCHEMY_READER_MAX_OVERFLOW = 0
+    engine = create_engine(args.uri, EngineType.READER, name="bench")
+
+    async def worker(worker_id: int, latencies: list[float]) -> None:
+        for i in range(args.requests):
+            start = time.perf_counter()
+            async with engine.connect() as connection:
+                await connection.execute(QUERY, {"pages": 0, "name": f"pg_{chr(97 + (worker_id + i) % 26)}"})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    # Open the pool's connections before measuring.
+    await asyncio.gather(*(worker(w, []) for w in range(args.pool_size)))
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w, latencies) for w in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{'pgbouncer' if pgbouncer else 'default':>9}: {len(latencies) / elapsed:8.0f} queries/s  "
+        f"p50={statistics.median(latencies):.3f}ms  "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.3f}ms"
+    )
+    await engine.dispose()
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Statement logging would take longer than the statements themselves.
+    settings.DEBUG = False
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    modes = {"default": [False], "pgbouncer": [True], "both": [False, True]}[args.mode]
+    for pgbouncer in modes:
+        await bench(args, pgbouncer)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=settings.SQLALCHEMY_POSTGRES_URI)
+    parser.add_argument("--mode", choices=["default", "pgbouncer", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Queries per worker")
+    parser.add_argument("--pool-size", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
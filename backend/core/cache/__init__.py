@@ -1,9 +1,17 @@
 from .cache_manager import Cache
+from .codec import DefaultCodec
 from .default_key_maker import DefaultKeyMaker
+from .invalidation import RedisInvalidationBus
+from .memory_backend import InMemoryBackend
+from .near_cache import NearCacheBackend
 from .redis_backend import RedisBackend
 
 __all__ = [
     "Cache",
+    "DefaultCodec",
     "DefaultKeyMaker",
+    "InMemoryBackend",
+    "NearCacheBackend",
     "RedisBackend",
+    "RedisInvalidationBus",
 ]
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Mapping, Optional, Sequence
+from uuid import uuid4
 
 
 class BaseBackend(ABC):
@@ -11,3 +12,35 @@ class BaseBackend(ABC):
 
     @abstractmethod
     async def delete_startswith(self, value: str) -> None: ...
+
+    @abstractmethod
+    async def delete_many(self, keys: Sequence[str]) -> None: ...
+
+    async def get_many(self, keys: Sequence[str]) -> list[Any]:
+        """
+        Return the values of `keys`, in order, with `None` for the missing ones.
+        """
+        return [await self.get_(key) for key in keys]
+
+    async def set_many(self, mapping: Mapping[str, Any], ttl: int = 60) -> None:
+        for key, value in mapping.items():
+            await self.set_(key, value, ttl=ttl)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """
+        Try to take a short-lived lease on `key`, shared by every worker using the backend.
+
+        Returns a token to pass to `release_lock` when the lease was granted, `None` otherwise.
+        Backends without cross-process coordination always grant it.
+        """
+        return uuid4().hex
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """
+        Release a lease taken with `acquire_lock`, unless it already expired and was taken over.
+        """
+
+    async def close(self) -> None:
+        """
+        Release the resources held by the backend (connection pools, background tasks).
+        """
@@ -1,10 +1,18 @@
+import asyncio
+import inspect
+import random
+import time
 from functools import wraps
-from typing import Callable, TypeVar
+from typing import Any, Awaitable, Callable, Mapping, Optional, Sequence, TypeVar
+from uuid import uuid4
 
 import core.utils as ut
-from core.utils.decorators import stopwatch
+from core.logger import syslog
 
 from .base import BaseBackend, BaseKeyMaker
+from .entry import CacheEntry
+from .lru import MISSING, LRUStore
+from .metrics import ERRORS, REQUESTS, prefix_of, track
 
 T = TypeVar("T")
 
@@ -13,34 +21,445 @@ class CacheManager:
     def __init__(self):
         self.backend: BaseBackend = None
         self.key_maker: BaseKeyMaker = None
+        # Distributed lease taken by the worker recomputing a missing key; disabled when `None`.
+        self.lock_ttl: Optional[float] = None
+        self.lock_wait: float = 0
+        self.lock_poll_interval: float = 0.05
+        # Fraction of the TTL added at random to every write, so keys written together do not expire together.
+        self.ttl_jitter: float = 0
+        # Lifetime of cached "not found" results and failures; negative caching is disabled when 0.
+        self.negative_ttl: int = 0
+        # Lifetime of tag version keys; it should exceed the longest TTL of a tagged entry.
+        self.tag_ttl: int = 30 * 24 * 60 * 60
+        # Decorator applied to computations that outlive the request that started them (background refreshes, and
+        # misses whose first caller was cancelled), e.g. to give them their own DB session.
+        self.background_scope: Optional[Callable[[Callable], Callable]] = None
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()
+        # Hits seen on this worker for keys inside their refresh-ahead window.
+        self._near_expiry_hits = LRUStore(max_entries=10_000)
 
-    def configure(self, backend: BaseBackend, key_maker: BaseKeyMaker):
+    def configure(
+        self,
+        backend: BaseBackend,
+        key_maker: BaseKeyMaker,
+        *,
+        lock_ttl: Optional[float] = None,
+        lock_wait: float = 0,
+        ttl_jitter: float = 0,
+        negative_ttl: int = 0,
+        tag_ttl: Optional[int] = None,
+        background_scope: Optional[Callable[[Callable], Callable]] = None,
+    ):
         self.backend = backend
         self.key_maker = key_maker
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.ttl_jitter = ttl_jitter
+        self.negative_ttl = negative_ttl
+        self.tag_ttl = tag_ttl or self.tag_ttl
+        self.background_scope = background_scope
+
+    async def close(self):
+        for task in list(self._background):
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self.backend:
+            await self.backend.close()
 
-    @stopwatch(prefix="cache")
     async def attempt(self, key: str, ttl: int, fn: Callable[..., T], *args, **kwargs) -> T | None:
+        return await self._attempt(key, ttl, fn, args, kwargs)
+
+    async def invalidate_tags(self, *tags: str) -> None:
+        """
+        Invalidate every entry written with any of `tags`.
+
+        Each tag owns a version key. Entries record the versions of their tags when they are computed,
+        and a tagged read fetches the current versions together with the entry. Invalidating a tag only
+        replaces its version, so the cost does not depend on how many keys are cached.
+        """
+        be = self.backend
+
+        if not be:
+            raise ValueError("Backend not initialized")
+
+        await be.set_many({self._tag_key(tag): uuid4().hex for tag in tags}, ttl=self.tag_ttl)
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+
+    async def attempt_many(
+        self,
+        keys: Sequence[str],
+        ttl: int,
+        fn: Callable[[list[str]], Mapping[str, T] | Awaitable[Mapping[str, T]]],
+    ) -> dict[str, T | None]:
+        """
+        Return the cached values of `keys`, computing all the missing ones with a single call to `fn`.
+
+        Hits are fetched in one backend round trip. `fn` receives the list of missing keys and returns
+        a mapping from key to value; keys it leaves out are returned as `None` and, when negative
+        caching is enabled, remembered as absent for `negative_ttl` seconds.
+
+        Example:
+            ```python
+            keys = {f"user:{user_id}": user_id for user_id in user_ids}
+
+            async def load(missing: list[str]) -> dict[str, User]:
+                users = await repository.get_many(where_=[User.id.in_([keys[k] for k in missing])])
+                return {f"user:{user.id}": user for user in users}
+
+            users = await Cache.attempt_many(list(keys), ttl=60, fn=load)
+            ```
+        """
+        be = self.backend
+        ttl = ttl or 60
+
+        if not be:
+            raise ValueError("Backend not initialized")
+
+        if not keys:
+            return {}
+        prefix = prefix_of(keys[0])
+
+        now = time.time()
+        result: dict[str, T | None] = {}
+        missing: list[str] = []
+        hits = negatives = 0
+        with track(prefix, "get"):
+            cached_responses = await be.get_many(keys)
+        for key, cached_response in zip(keys, cached_responses):
+            if isinstance(cached_response, CacheEntry):
+                if cached_response.is_stale(now):
+                    cached_response = None
+                elif cached_response.negative:
+                    negatives += 1
+                    result[key] = None
+                    continue
+                else:
+                    cached_response = cached_response.value
+            result[key] = cached_response
+            if cached_response is None:
+                missing.append(key)
+            else:
+                hits += 1
+        REQUESTS.inc(len(missing), prefix=prefix, result="miss")
+        REQUESTS.inc(hits, prefix=prefix, result="hit")
+        REQUESTS.inc(negatives, prefix=prefix, result="negative")
+
+        if not missing:
+            return result
+
+        with track(prefix, "recompute"):
+            response = await ut.attempt(fn, missing)
+        if ut.is_error(response):
+            ERRORS.inc(prefix=prefix, operation="recompute")
+            raise response
+
+        computed = {key: value for key, value in response.items() if key in result and value is not None}
+        with track(prefix, "set"):
+            await be.set_many(computed, ttl=self._jittered(ttl))
+            if self.negative_ttl:
+                absent = {
+                    key: CacheEntry.wrap_negative(None, self.negative_ttl) for key in missing if key not in computed
+                }
+                await be.set_many(absent, ttl=self.negative_ttl)
+        result.update(computed)
+        return result
+
+    async def _attempt(
+        self,
+        key: str,
+        ttl: int,
+        fn: Callable[..., T],
+        args: tuple,
+        kwargs: dict,
+        *,
+        stale_ttl: int = 0,
+        refresh_ahead: float = 0,
+        refresh_ahead_hits: int = 1,
+        tags: Sequence[str] = (),
+        negative_ttl: Optional[int] = None,
+    ) -> T | None:
+        """
+        Return the cached value for `key`, computing it with `fn` on a miss.
+
+        With `stale_ttl`, values are kept for `stale_ttl` seconds after they expire and are served
+        as-is while a background task refreshes them. With `refresh_ahead`, a key hit at least
+        `refresh_ahead_hits` times during the last `refresh_ahead` fraction of its TTL is refreshed
+        in the background before it expires. With `tags`, the entry is read together with the
+        current versions of its tags, in the same round trip, and ignored if any of them changed.
+        With `negative_ttl`, a `None` result or an exception raised by `fn` is cached for that many
+        seconds; hits return `None` or re-raise the exception without calling `fn`.
+        """
         be = self.backend
         ttl = ttl or 60
+        negative_ttl = self.negative_ttl if negative_ttl is None else negative_ttl
 
         if not be:
             raise ValueError("Backend not initialized")
 
-        cached_response = await be.get_(key)
-        if cached_response is not None:
+        prefix = prefix_of(key)
+        versions = None
+        with track(prefix, "get"):
+            if tags:
+                cached_response, *tag_versions = await be.get_many([key, *(self._tag_key(tag) for tag in tags)])
+                versions = dict(zip(tags, tag_versions))
+            else:
+                cached_response = await be.get_(key)
+
+        if isinstance(cached_response, CacheEntry) and cached_response.matches(versions):
+            if cached_response.negative:
+                REQUESTS.inc(prefix=prefix, result="negative")
+                return cached_response.resolve()
+            now = time.time()
+            stale = cached_response.is_stale(now)
+            if stale or (
+                refresh_ahead and self._is_hot_near_expiry(key, cached_response, now, refresh_ahead, refresh_ahead_hits)
+            ):
+                self._refresh_in_background(
+                    key, ttl, fn, args, kwargs, stale_ttl=stale_ttl, negative_ttl=negative_ttl, tags=versions
+                )
+            REQUESTS.inc(prefix=prefix, result="stale" if stale else "hit")
+            return cached_response.value
+        if cached_response is not None and not isinstance(cached_response, CacheEntry) and not tags:
+            REQUESTS.inc(prefix=prefix, result="hit")
             return cached_response
 
-        response = await ut.attempt(fn, *args, **kwargs)
-        is_error = ut.is_error(response)
-        await be.set_(key=key, value=response if not is_error else None, ttl=ttl)
+        REQUESTS.inc(prefix=prefix, result="miss")
+        return await self._single_flight(
+            key,
+            lambda: self._recompute(
+                key,
+                ttl,
+                fn,
+                args,
+                kwargs,
+                stale_ttl=stale_ttl,
+                negative_ttl=negative_ttl,
+                wrap=bool(stale_ttl or refresh_ahead or tags),
+                tags=versions,
+            ),
+        )
+
+    def _is_hot_near_expiry(self, key: str, entry: CacheEntry, now: float, window: float, min_hits: int) -> bool:
+        if not entry.is_near_expiry(now, window):
+            return False
+        hits = self._near_expiry_hits.get(key)
+        hits = 1 if hits is MISSING else hits + 1
+        self._near_expiry_hits.set(key, hits, ttl=max(entry.fresh_until - now, 0.001))
+        return hits >= min_hits
+
+    def _refresh_in_background(
+        self,
+        key: str,
+        ttl: int,
+        fn: Callable[..., T],
+        args: tuple,
+        kwargs: dict,
+        *,
+        stale_ttl: int,
+        negative_ttl: int = 0,
+        tags: Optional[dict[str, Any]] = None,
+    ) -> None:
+        if key in self._inflight:
+            return
+        self._near_expiry_hits.delete(key)
+
+        async def _refresh():
+            try:
+                await self._single_flight(
+                    key,
+                    lambda: self._recompute(
+                        key,
+                        ttl,
+                        fn,
+                        args,
+                        kwargs,
+                        stale_ttl=stale_ttl,
+                        negative_ttl=negative_ttl,
+                        wrap=True,
+                        wait=False,
+                        tags=tags,
+                    ),
+                    detached=True,
+                )
+            except Exception as e:
+                syslog.error(f"Background refresh failed for cache key {key}: {e}")
+
+        task = asyncio.create_task(_refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[T]], *, detached: bool = False) -> T:
+        """
+        Run `factory` at most once at a time per key on this worker.
+
+        Concurrent callers for the same key await the computation started by the first one, in its own
+        task, so that a cancelled follower does not cancel it for the others. The computation uses the
+        session of the caller that started it, and so sees its uncommitted writes; `detached` ones, which
+        outlive their caller, run under `background_scope` instead. When the caller that started an
+        attached computation is cancelled, its session is about to be closed: the computation is
+        cancelled as well, and restarted detached by the first caller still waiting for it.
+        """
+        while True:
+            task = self._inflight.get(key)
+            started = task is None
+            if started:
+                run = self.background_scope(factory) if detached and self.background_scope is not None else factory
+                task = asyncio.ensure_future(run())
+                self._inflight[key] = task
+                task.add_done_callback(lambda t: self._forget(key, t))
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if started and not detached:
+                    task.cancel()
+                # Only retry when the computation was cancelled under this caller, not the caller itself.
+                if started or not task.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                detached = True
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller was cancelled before the task finished.
+        if not task.cancelled():
+            task.exception()
+
+    async def _recompute(
+        self,
+        key: str,
+        ttl: int,
+        fn: Callable[..., T],
+        args: tuple,
+        kwargs: dict,
+        *,
+        stale_ttl: int = 0,
+        negative_ttl: int = 0,
+        wrap: bool = False,
+        wait: bool = True,
+        tags: Optional[dict[str, Any]] = None,
+    ) -> T | None:
+        be = self.backend
+        prefix = prefix_of(key)
+        lock_key = f"lock:{key}"
+        token = None
+
+        if self.lock_ttl:
+            token = await be.acquire_lock(lock_key, self.lock_ttl)
+            if token is None:
+                if not wait:
+                    # Another worker is already refreshing the entry; keep serving the stale value.
+                    return None
+                cached_response = await self._wait_for(key, tags)
+                if cached_response is not None:
+                    return self._unwrap(cached_response)
+            elif wait:
+                # The previous holder may have filled the cache right before releasing the lease.
+                cached_response = await be.get_(key)
+                if self._is_usable(cached_response, tags):
+                    await be.release_lock(lock_key, token)
+                    return self._unwrap(cached_response)
+
+        try:
+            with track(prefix, "recompute"):
+                response = await ut.attempt(fn, *args, **kwargs)
+            is_error = ut.is_error(response)
+            if is_error:
+                ERRORS.inc(prefix=prefix, operation="recompute")
+            if is_error or response is None:
+                # A failed background refresh leaves the previous entry in place.
+                if negative_ttl and (wait or not is_error):
+                    await self._set_negative(key, response if is_error else None, negative_ttl, tags)
+            elif wrap:
+                soft_ttl = self._jittered(ttl)
+                with track(prefix, "set"):
+                    await be.set_(key=key, value=CacheEntry.wrap(response, soft_ttl, tags), ttl=soft_ttl + stale_ttl)
+            else:
+                with track(prefix, "set"):
+                    await be.set_(key=key, value=response, ttl=self._jittered(ttl))
+        finally:
+            if token is not None:
+                await be.release_lock(lock_key, token)
 
         if is_error:
             raise response
 
         return response if not isinstance(response, Exception) else None
 
-    def cached(self, prefix: str = None, ttl: int = 60, key_maker: BaseKeyMaker = None):
+    async def _set_negative(
+        self, key: str, error: Optional[Exception], ttl: int, tags: Optional[dict[str, Any]] = None
+    ) -> None:
+        try:
+            with track(prefix_of(key), "set"):
+                await self.backend.set_(key=key, value=CacheEntry.wrap_negative(error, ttl, tags), ttl=ttl)
+        except Exception as e:
+            # Some exceptions cannot be serialized; the failure is then simply not cached.
+            syslog.error(f"Failed to cache negative result for {key}: {e}")
+
+    async def _wait_for(self, key: str, tags: Optional[dict[str, Any]] = None) -> Any:
+        """
+        Poll the backend for `key` until it is filled or `lock_wait` seconds have passed.
+        """
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            cached_response = await self.backend.get_(key)
+            if self._is_usable(cached_response, tags):
+                return cached_response
+        return None
+
+    @staticmethod
+    def _is_usable(cached_response: Any, tags: Optional[dict[str, Any]]) -> bool:
+        if isinstance(cached_response, CacheEntry):
+            return cached_response.matches(tags) and not cached_response.is_stale(time.time())
+        return cached_response is not None and not tags
+
+    @staticmethod
+    def _unwrap(cached_response: Any) -> Any:
+        return cached_response.resolve() if isinstance(cached_response, CacheEntry) else cached_response
+
+    def _jittered(self, ttl: int) -> int:
+        if not self.ttl_jitter:
+            return ttl
+        return ttl + random.randint(0, int(ttl * self.ttl_jitter))
+
+    def cached(
+        self,
+        prefix: str = None,
+        ttl: int = 60,
+        key_maker: BaseKeyMaker = None,
+        *,
+        stale_ttl: int = 0,
+        refresh_ahead: float = 0,
+        refresh_ahead_hits: int = 1,
+        tags: Sequence[str] = (),
+        negative_ttl: Optional[int] = None,
+    ):
+        """
+        Cache the results of the decorated coroutine.
+
+        Args:
+            prefix (str): Prefix of the generated keys.
+            ttl (int): Seconds a value is considered fresh.
+            key_maker (BaseKeyMaker): Overrides the configured key maker.
+            stale_ttl (int): Seconds an expired value may still be served while it is refreshed in the
+                background (stale-while-revalidate). Disabled when 0.
+            refresh_ahead (float): Fraction of `ttl`, at the end of the freshness window, during which
+                hits trigger a background refresh. Disabled when 0.
+            refresh_ahead_hits (int): Hits needed inside the refresh-ahead window before refreshing.
+            tags (Sequence[str]): Tags of the entries, formatted with the call's arguments, e.g.
+                `"user:{user_id}"`. Entries are invalidated with `invalidate_tags`.
+            negative_ttl (int): Seconds a `None` result or a raised exception is cached. Defaults to the
+                configured `negative_ttl`; 0 disables negative caching.
+        """
+
         def _cached(fn):
+            signature = inspect.signature(fn) if tags else None
+
             @wraps(fn)
             async def __cached(*args, **kwargs):
                 be = self.backend
@@ -51,7 +470,18 @@ class CacheManager:
 
                 key = await km.make(fn=fn, prefix=prefix, args=args, kwargs=kwargs)
 
-                response = await self.attempt(key, ttl, fn, *args, **kwargs)
+                response = await self._attempt(
+                    key,
+                    ttl,
+                    fn,
+                    args,
+                    kwargs,
+                    stale_ttl=stale_ttl,
+                    refresh_ahead=refresh_ahead,
+                    refresh_ahead_hits=refresh_ahead_hits,
+                    tags=self._format_tags(tags, signature, args, kwargs),
+                    negative_ttl=negative_ttl,
+                )
 
                 return response
 
@@ -59,5 +489,15 @@ class CacheManager:
 
         return _cached
 
+    @staticmethod
+    def _format_tags(
+        tags: Sequence[str], signature: Optional[inspect.Signature], args: tuple, kwargs: dict
+    ) -> list[str]:
+        if not tags:
+            return []
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        return [tag.format(**bound.arguments) for tag in tags]
+
 
 Cache = CacheManager()
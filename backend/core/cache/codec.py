@@ -0,0 +1,205 @@
+import importlib
+import json
+import pickle
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel
+
+import core.utils as ut
+
+from .base import BaseCodec
+from .entry import CacheEntry
+
+if ut.has("orjson"):
+    import orjson
+
+    def _json_dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    _json_loads = orjson.loads
+else:
+
+    def _json_dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf8")
+
+    _json_loads = json.loads
+
+
+# The first byte of every payload selects the decoder. The low nibble is the format, the high nibble
+# the compression. Values written before the header existed start with "{" (JSON) or 0x80 (pickle).
+FORMAT_JSON = 0x01
+FORMAT_MSGPACK = 0x02
+FORMAT_PYDANTIC = 0x03
+FORMAT_PICKLE = 0x04
+FORMAT_ENTRY = 0x05
+
+COMPRESSION_ZLIB = 0x10
+COMPRESSION_LZ4 = 0x20
+
+_FORMAT_MASK = 0x0F
+_COMPRESSION_MASK = 0xF0
+_LEGACY_PICKLE = 0x80
+
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+_DICTS = frozenset((dict,))
+_LISTS = frozenset((list,))
+_ENTRY_META = struct.Struct("!I")
+
+
+def _is_plain(value: Any, depth: int = 0) -> bool:
+    """
+    Whether `value` round-trips through JSON/msgpack unchanged: str-keyed dicts, lists and scalars only.
+    """
+    if type(value) in _SCALARS:
+        return True
+    if depth > 32:
+        return False
+    if type(value) in _DICTS:
+        return all(isinstance(k, str) and _is_plain(v, depth + 1) for k, v in value.items())
+    if type(value) in _LISTS:
+        return all(_is_plain(v, depth + 1) for v in value)
+    return False
+
+
+@dataclass(slots=True)
+class CodecStats:
+    encoded: int = 0
+    decoded: int = 0
+    compressed: int = 0
+    # Payload sizes before and after compression, and of the payloads read back.
+    raw_bytes: int = 0
+    encoded_bytes: int = 0
+    decoded_bytes: int = 0
+
+
+class DefaultCodec(BaseCodec):
+    """
+    Encodes cached values with the cheapest lossless format for their type.
+
+    Plain data (dicts, lists, scalars) goes through orjson or msgpack, pydantic models through their
+    JSON representation, cache entries through a small envelope around the encoded value, and
+    everything else (ORM instances, tuples, datetimes...) through pickle. Payloads larger than
+    `compression_threshold` bytes are compressed when that makes them smaller.
+    """
+
+    def __init__(
+        self,
+        *,
+        serializer: Literal["json", "msgpack"] = "json",
+        compression: Literal["none", "zlib", "lz4"] = "zlib",
+        compression_threshold: int = 1024,
+        compression_level: int = 1,
+    ):
+        if serializer == "msgpack" and not ut.has("msgpack"):
+            raise ValueError("The msgpack serializer requires the 'msgpack' package")
+        if compression == "lz4" and not ut.has("lz4"):
+            raise ValueError("lz4 compression requires the 'lz4' package")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self.stats = CodecStats()
+        self._models: dict[str, type[BaseModel]] = {}
+
+    def encode(self, value: Any) -> bytes:
+        fmt, payload = self._serialize(value)
+        self.stats.encoded += 1
+        self.stats.raw_bytes += len(payload) + 1
+
+        compression = 0
+        if self.compression != "none" and len(payload) >= self.compression_threshold:
+            compression, compressed = self._compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                self.stats.compressed += 1
+            else:
+                compression = 0
+
+        self.stats.encoded_bytes += len(payload) + 1
+        return bytes((fmt | compression,)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        self.stats.decoded += 1
+        self.stats.decoded_bytes += len(data)
+
+        header = data[0]
+        if header == _LEGACY_PICKLE:
+            return pickle.loads(data)
+        if header == ord("{"):
+            return _json_loads(data)
+
+        payload = self._decompress(header & _COMPRESSION_MASK, memoryview(data)[1:])
+        return self._deserialize(header & _FORMAT_MASK, payload)
+
+    def _serialize(self, value: Any) -> tuple[int, bytes]:
+        if isinstance(value, CacheEntry):
+            meta = _json_dumps([value.fresh_until, value.ttl, value.tags, value.negative])
+            fmt, payload = self._serialize(value.value)
+            return FORMAT_ENTRY, _ENTRY_META.pack(len(meta)) + meta + bytes((fmt,)) + payload
+        if _is_plain(value):
+            try:
+                if self.serializer == "msgpack":
+                    import msgpack
+
+                    return FORMAT_MSGPACK, msgpack.packb(value)
+                return FORMAT_JSON, _json_dumps(value)
+            except (TypeError, ValueError, OverflowError):
+                # e.g. integers wider than 64 bits; pickle handles them.
+                pass
+        if isinstance(value, BaseModel):
+            cls = type(value)
+            path = f"{cls.__module__}:{cls.__qualname__}".encode("utf8")
+            return FORMAT_PYDANTIC, path + b"\n" + value.model_dump_json().encode("utf8")
+        return FORMAT_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _deserialize(self, fmt: int, payload: memoryview | bytes) -> Any:
+        if fmt == FORMAT_JSON:
+            return _json_loads(bytes(payload))
+        if fmt == FORMAT_PICKLE:
+            return pickle.loads(payload)
+        if fmt == FORMAT_MSGPACK:
+            import msgpack
+
+            return msgpack.unpackb(payload)
+        if fmt == FORMAT_PYDANTIC:
+            payload = bytes(payload)
+            path, _, body = payload.partition(b"\n")
+            return self._model(path.decode("utf8")).model_validate_json(body)
+        if fmt == FORMAT_ENTRY:
+            (size,) = _ENTRY_META.unpack_from(payload)
+            start = _ENTRY_META.size
+            fresh_until, ttl, tags, negative = _json_loads(bytes(payload[start : start + size]))
+            value = self._deserialize(payload[start + size], payload[start + size + 1 :])
+            return CacheEntry(value=value, fresh_until=fresh_until, ttl=ttl, tags=tags, negative=negative)
+        raise ValueError(f"Unknown cache payload format: {fmt}")
+
+    def _compress(self, payload: bytes) -> tuple[int, bytes]:
+        if self.compression == "lz4":
+            import lz4.frame
+
+            return COMPRESSION_LZ4, lz4.frame.compress(payload)
+        return COMPRESSION_ZLIB, zlib.compress(payload, self.compression_level)
+
+    @staticmethod
+    def _decompress(compression: int, payload: memoryview) -> memoryview | bytes:
+        if compression == COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if compression == COMPRESSION_LZ4:
+            import lz4.frame
+
+            return lz4.frame.decompress(payload)
+        return payload
+
+    def _model(self, path: str) -> type[BaseModel]:
+        model: Optional[type[BaseModel]] = self._models.get(path)
+        if model is None:
+            module, _, qualname = path.partition(":")
+            model = importlib.import_module(module)
+            for name in qualname.split("."):
+                model = getattr(model, name)
+            self._models[path] = model
+        return model
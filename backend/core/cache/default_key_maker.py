@@ -1,18 +1,107 @@
+import hashlib
 import inspect
-from typing import Callable
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
 
 from .base import BaseKeyMaker
 
+_VERBATIM = (str, int, float, bool, type(None), UUID, datetime, date, time)
+_BOUND_NAMES = frozenset(("self", "cls"))
+
+
+@dataclass(slots=True)
+class _KeySpec:
+    path: str
+    # Parameters that can be passed positionally, in order, and every named parameter, in order.
+    positional: tuple[str, ...]
+    names: tuple[str, ...]
+    defaults: dict[str, Any]
+    skip: frozenset[str]
+
 
 class DefaultKeyMaker(BaseKeyMaker):
+    """
+    Builds keys as `{prefix}:{module}.{qualname}:{param}={value}:...`.
+
+    The signature of each function is inspected once and reused, positional and keyword arguments
+    are both taken into account, and `self`/`cls` is left out. Values that are not simple scalars are
+    replaced by a short digest of a stable representation, and keys longer than `max_length` have
+    their parameters replaced by a digest.
+    """
+
+    def __init__(self, *, max_length: int = 200, max_value_length: int = 64):
+        self.max_length = max_length
+        self.max_value_length = max_value_length
+        self._specs: dict[tuple[Callable, Optional[str]], _KeySpec] = {}
+
     async def make(self, fn: Callable, prefix: str, args: tuple, kwargs: dict) -> str:
-        path: str = f"{prefix}:{inspect.getmodule(fn).__name__}.{fn.__name__}"
-        params: str = ""
+        spec = self._specs.get((fn, prefix))
+        if spec is None:
+            spec = self._specs[(fn, prefix)] = self._compile(fn, prefix)
+
+        values = dict(spec.defaults)
+        values.update(zip(spec.positional, args))
+        values.update(kwargs)
+
+        params = [f"{name}={self._format(values.get(name))}" for name in spec.names if name not in spec.skip]
+        if len(args) > len(spec.positional):
+            params.append(f"*={self._format(list(args[len(spec.positional) :]))}")
+        for name in sorted(kwargs.keys() - set(spec.names)):
+            params.append(f"{name}={self._format(kwargs[name])}")
+
+        if not params:
+            return spec.path
+
+        key = f"{spec.path}:{':'.join(params)}"
+        if len(key) > self.max_length:
+            return f"{spec.path}:#{self._digest(':'.join(params), 16)}"
+        return key
+
+    @staticmethod
+    def _compile(fn: Callable, prefix: Optional[str]) -> _KeySpec:
+        signature = inspect.signature(fn)
+        parameters = list(signature.parameters.values())
+        positional = tuple(p.name for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+        names = tuple(p.name for p in parameters if p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD))
+        defaults = {p.name: p.default for p in parameters if p.default is not p.empty}
+        skip = frozenset(positional[:1]) & _BOUND_NAMES
+        return _KeySpec(
+            path=f"{prefix}:{fn.__module__}.{fn.__qualname__}",
+            positional=positional,
+            names=names,
+            defaults=defaults,
+            skip=skip,
+        )
 
-        for param in inspect.signature(fn).parameters.values():
-            params += f"{param.name}={kwargs.get(param.name)}:"
+    def _format(self, value: Any) -> str:
+        if isinstance(value, Enum):
+            value = value.value
+        if isinstance(value, _VERBATIM):
+            text = str(value)
+            if len(text) <= self.max_value_length and ":" not in text:
+                return text
+            return f"#{self._digest(text)}"
+        if isinstance(value, BaseModel):
+            return f"#{self._digest(value.model_dump_json())}"
+        # Containers and other objects: a canonical JSON form, so equal arguments give equal keys
+        # regardless of dict ordering or whether they are hashable.
+        text = json.dumps(value, sort_keys=True, default=self._fallback, separators=(",", ":"))
+        return f"#{self._digest(text)}"
 
-        if params:
-            return f"{path}:{params[:-1]}"
+    @staticmethod
+    def _fallback(value: Any) -> Any:
+        if isinstance(value, (set, frozenset)):
+            return sorted(value, key=repr)
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json")
+        return str(value)
 
-        return path
+    @staticmethod
+    def _digest(text: str, size: int = 8) -> str:
+        return hashlib.blake2b(text.encode("utf8"), digest_size=size).hexdigest()
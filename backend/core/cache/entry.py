@@ -0,0 +1,56 @@
+import copy
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """
+    A cached value stored together with its freshness metadata.
+
+    Entries stay in the backend past `fresh_until` (up to the hard TTL) so that a stale value can be
+    served while a fresh one is computed in the background.
+    """
+
+    value: Any
+    fresh_until: float
+    ttl: int
+    # Versions of the entry's tags when it was computed; the entry is void once any of them changes.
+    tags: Optional[dict[str, Any]] = None
+    # A cached "not found" (`value` is None) or failure (`value` is the exception), distinct from a miss.
+    negative: bool = False
+
+    @classmethod
+    def wrap(cls, value: Any, ttl: int, tags: Optional[dict[str, Any]] = None) -> "CacheEntry":
+        return cls(value=value, fresh_until=time.time() + ttl, ttl=ttl, tags=tags)
+
+    @classmethod
+    def wrap_negative(
+        cls, error: Optional[BaseException], ttl: int, tags: Optional[dict[str, Any]] = None
+    ) -> "CacheEntry":
+        error = _detached(error) if error is not None else None
+        return cls(value=error, fresh_until=time.time() + ttl, ttl=ttl, tags=tags, negative=True)
+
+    def resolve(self) -> Any:
+        """
+        Return the cached value, raising a copy of the cached exception of a negative entry.
+        """
+        if self.negative and isinstance(self.value, BaseException):
+            raise _detached(self.value)
+        return self.value
+
+    def matches(self, tags: Optional[dict[str, Any]]) -> bool:
+        return (self.tags or None) == (tags or None)
+
+    def is_stale(self, now: float) -> bool:
+        return now >= self.fresh_until
+
+    def is_near_expiry(self, now: float, window: float) -> bool:
+        return now >= self.fresh_until - self.ttl * window
+
+
+def _detached(error: BaseException) -> BaseException:
+    # A copy has no traceback, cause or context: the cached instance is shared between requests (e.g. by the near
+    # cache), and raising it would keep the frames of each request alive through its growing traceback.
+    return copy.copy(error)
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from uuid import uuid4
+
+import redis.asyncio as redis
+import ujson
+
+from core.logger import syslog
+
+
+class RedisInvalidationBus:
+    """
+    Broadcasts cache invalidations between workers over Redis pub/sub.
+
+    Every worker publishes the keys (or key prefixes) it writes or deletes, and listens for the ones
+    published by the other workers so that their in-process copies can be dropped.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        channel: str,
+        *,
+        poll_timeout: float = 1.0,
+        reconnect_delay: float = 1.0,
+    ):
+        self.client = client
+        self.channel = channel
+        # Reads are bounded by `poll_timeout` so an idle channel never trips the client's socket timeout.
+        self.poll_timeout = poll_timeout
+        self.reconnect_delay = reconnect_delay
+        self.node_id = uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, op: str, key: str | list[str]) -> None:
+        message = ujson.dumps({"node": self.node_id, "op": op, "key": key})
+        try:
+            await self.client.publish(self.channel, message)
+        except redis.RedisError as e:
+            syslog.error(f"Failed to publish cache invalidation ({op}): {e}")
+
+    def start(self, callback: Callable[[str, str], Awaitable[None] | None]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(callback))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, callback: Callable[[str, str], Awaitable[None] | None]) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Invalidations may have been missed while disconnected, so local copies are dropped.
+                await self._dispatch(callback, "flush", "")
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.poll_timeout)
+                    if message is None:
+                        continue
+                    payload = ujson.loads(message["data"])
+                    if payload.get("node") == self.node_id:
+                        continue
+                    await self._dispatch(callback, payload["op"], payload["key"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                syslog.error(f"Cache invalidation listener failed, reconnecting: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                await pubsub.aclose()
+
+    @staticmethod
+    async def _dispatch(callback: Callable[[str, str], Awaitable[None] | None], op: str, key: str) -> None:
+        result = callback(op, key)
+        if asyncio.iscoroutine(result):
+            await result
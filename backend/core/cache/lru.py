@@ -0,0 +1,126 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple, Optional
+
+MISSING = object()
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+    size: int
+
+
+def approximate_size(value: Any, depth: int = 3) -> int:
+    """
+    Cheaply estimate the memory footprint of a cached value in bytes.
+
+    Containers and plain objects are walked up to `depth` levels, which is enough to account for
+    dictionaries, lists of rows and ORM instances without paying for a full traversal.
+    """
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += approximate_size(k, depth - 1) + approximate_size(v, depth - 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += approximate_size(item, depth - 1)
+    elif hasattr(value, "__dict__") and not isinstance(value, type):
+        size += approximate_size(vars(value), depth - 1)
+    return size
+
+
+class LRUStore:
+    """
+    A bounded, in-process least-recently-used store with a per-entry TTL.
+
+    The store is capped both by the number of entries and by the approximate number of bytes held.
+    Expired entries are dropped lazily on access and eagerly when room is needed.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: Optional[int] = None,
+        *,
+        on_remove: Optional[Callable[[str], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # Called with the key of every entry dropped from the store (deleted, expired or evicted).
+        self.on_remove = on_remove
+        self._data: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not MISSING
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        if entry.expires_at <= time.monotonic():
+            self._pop(key)
+            return MISSING
+        self._data.move_to_end(key)
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: float, size: Optional[int] = None) -> bool:
+        """
+        Store `value` under `key`. Returns False when the value was not stored.
+        """
+        if ttl is not None and ttl <= 0:
+            self._pop(key)
+            return False
+
+        size = approximate_size(value) if size is None else size
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never let a single oversized value flush the whole store.
+            self._pop(key)
+            return False
+
+        previous = self._data.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= previous.size
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        self._data[key] = _Entry(value=value, expires_at=expires_at, size=size)
+        self.current_bytes += size
+        self._evict()
+        return True
+
+    def delete(self, key: str) -> None:
+        self._pop(key)
+
+    def delete_startswith(self, prefix: str) -> None:
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            self._pop(key)
+
+    def clear(self) -> None:
+        if self.on_remove is not None:
+            for key in self._data:
+                self.on_remove(key)
+        self._data.clear()
+        self.current_bytes = 0
+
+    def _pop(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+            if self.on_remove is not None:
+                self.on_remove(key)
+
+    def _evict(self) -> None:
+        while len(self._data) > self.max_entries or (
+            self.max_bytes is not None and self.current_bytes > self.max_bytes
+        ):
+            key, entry = self._data.popitem(last=False)
+            self.current_bytes -= entry.size
+            if self.on_remove is not None:
+                self.on_remove(key)
@@ -0,0 +1,82 @@
+import bisect
+import time
+from typing import Any, Optional, Sequence
+from uuid import uuid4
+
+from .base import BaseBackend, BaseCodec
+from .codec import DefaultCodec
+from .lru import MISSING, LRUStore
+from .metrics import record_read, record_write
+
+
+class InMemoryBackend(BaseBackend):
+    """
+    A bounded, process-local backend: an LRU with per-entry TTL capped in entries and bytes.
+
+    Values are stored encoded, so the byte cap is exact and callers always get their own copy, as
+    with a network cache. Keys are also kept in a sorted index so `delete_startswith` only visits
+    the matching keys. Meant for local runs, tests and benchmarks; nothing is shared between workers.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 100_000,
+        max_bytes: Optional[int] = 256 * 1024 * 1024,
+        codec: Optional[BaseCodec] = None,
+    ):
+        self.codec = codec or DefaultCodec(compression="none")
+        self.store = LRUStore(max_entries=max_entries, max_bytes=max_bytes, on_remove=self._unindex)
+        self._keys: set[str] = set()
+        self._sorted_keys: list[str] = []
+        self._locks: dict[str, tuple[str, float]] = {}
+
+    async def get_(self, key: str) -> Any:
+        data = self.store.get(key)
+        if data is MISSING:
+            return None
+        record_read(key, data)
+        return self.codec.decode(data)
+
+    async def set_(self, key: str, value: Any, ttl: int = 60) -> None:
+        data = self.codec.encode(value)
+        record_write(key, data)
+        if self.store.set(key, data, ttl=ttl, size=len(key) + len(data)) and key not in self._keys:
+            self._keys.add(key)
+            bisect.insort(self._sorted_keys, key)
+
+    async def delete_many(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self.store.delete(key)
+
+    async def delete_startswith(self, value: str) -> None:
+        start = bisect.bisect_left(self._sorted_keys, value)
+        end = start
+        while end < len(self._sorted_keys) and self._sorted_keys[end].startswith(value):
+            end += 1
+        for key in self._sorted_keys[start:end]:
+            self.store.delete(key)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        holder = self._locks.get(key)
+        if holder is not None and holder[1] > now:
+            return None
+        token = uuid4().hex
+        self._locks[key] = (token, now + ttl)
+        return token
+
+    async def release_lock(self, key: str, token: str) -> None:
+        holder = self._locks.get(key)
+        if holder is not None and holder[0] == token:
+            del self._locks[key]
+
+    async def close(self) -> None:
+        self.store.clear()
+        self._locks.clear()
+
+    def _unindex(self, key: str) -> None:
+        if key in self._keys:
+            self._keys.discard(key)
+            index = bisect.bisect_left(self._sorted_keys, key)
+            del self._sorted_keys[index]
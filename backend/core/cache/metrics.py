@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from core.metrics import Metrics
+
+REQUESTS = Metrics.counter(
+    "cache_requests",
+    "Cache lookups by key prefix and result (hit, stale, negative, miss).",
+    labels=["prefix", "result"],
+)
+ERRORS = Metrics.counter(
+    "cache_errors",
+    "Failed backend calls and recomputations, by key prefix and operation.",
+    labels=["prefix", "operation"],
+)
+READ_BYTES = Metrics.counter("cache_read_bytes", "Encoded bytes read from the backend.", labels=["prefix"])
+WRITTEN_BYTES = Metrics.counter("cache_written_bytes", "Encoded bytes written to the backend.", labels=["prefix"])
+LATENCY = Metrics.histogram(
+    "cache_operation_seconds",
+    "Duration of backend reads and writes, and of the recomputation of missing values.",
+    labels=["prefix", "operation"],
+)
+NEAR_REQUESTS = Metrics.counter("cache_near_requests", "Near cache lookups by result (hit, miss).", labels=["result"])
+
+
+def prefix_of(key: str) -> str:
+    """
+    The first segment of a key, i.e. the `prefix` given to `Cache.cached`.
+    """
+    return key.partition(":")[0]
+
+
+def record_read(key: str, data: Optional[bytes]) -> None:
+    if data is not None:
+        READ_BYTES.inc(len(data), prefix=prefix_of(key))
+
+
+def record_write(key: str, data: bytes) -> None:
+    WRITTEN_BYTES.inc(len(data), prefix=prefix_of(key))
+
+
+@contextmanager
+def track(prefix: str, operation: str) -> Iterator[None]:
+    """
+    Time the enclosed block into the latency histogram and count the exception it raises, if any.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(prefix=prefix, operation=operation)
+        raise
+    finally:
+        LATENCY.observe(time.perf_counter() - start, prefix=prefix, operation=operation)
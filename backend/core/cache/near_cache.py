@@ -0,0 +1,119 @@
+from typing import Any, Mapping, Optional, Sequence
+
+from .base import BaseBackend
+from .invalidation import RedisInvalidationBus
+from .lru import MISSING, LRUStore
+from .metrics import NEAR_REQUESTS
+
+
+class NearCacheBackend(BaseBackend):
+    """
+    A two-tier backend: a bounded in-process LRU in front of any other backend.
+
+    Hot keys are served from process memory. Writes and prefix deletions go through to the wrapped
+    backend and are broadcast on the invalidation bus, so the other workers drop their local copies.
+    Local entries never outlive `local_ttl` seconds, which bounds staleness if a message is lost.
+
+    Values are shared between callers on a hit, so they must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        backend: BaseBackend,
+        *,
+        invalidator: Optional[RedisInvalidationBus] = None,
+        local_ttl: int = 5,
+        max_entries: int = 10_000,
+        max_bytes: Optional[int] = None,
+    ):
+        self.backend = backend
+        self.invalidator = invalidator
+        self.local_ttl = local_ttl
+        self.store = LRUStore(max_entries=max_entries, max_bytes=max_bytes)
+        # Bumped on every invalidation; a value fetched from the backend is only kept locally when no
+        # invalidation arrived while it was in flight.
+        self._generation = 0
+
+    def start(self) -> None:
+        if self.invalidator is not None:
+            self.invalidator.start(self._invalidate)
+
+    async def get_(self, key: str) -> Any:
+        value = self.store.get(key)
+        if value is not MISSING:
+            NEAR_REQUESTS.inc(result="hit")
+            return value
+
+        NEAR_REQUESTS.inc(result="miss")
+        generation = self._generation
+        value = await self.backend.get_(key)
+        if value is not None and generation == self._generation:
+            self.store.set(key, value, ttl=self.local_ttl)
+        return value
+
+    async def set_(self, key: str, value: Any, ttl: int = 60) -> None:
+        await self.backend.set_(key, value, ttl=ttl)
+        self._generation += 1
+        self.store.set(key, value, ttl=min(ttl, self.local_ttl) if ttl else self.local_ttl)
+        if self.invalidator is not None:
+            await self.invalidator.publish("key", key)
+
+    async def get_many(self, keys: Sequence[str]) -> list[Any]:
+        values = [self.store.get(key) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is MISSING]
+        NEAR_REQUESTS.inc(len(keys) - len(missing), result="hit")
+        NEAR_REQUESTS.inc(len(missing), result="miss")
+        if not missing:
+            return values
+
+        generation = self._generation
+        fetched = dict(zip(missing, await self.backend.get_many(missing)))
+        keep = generation == self._generation
+        for key, value in fetched.items():
+            if value is not None and keep:
+                self.store.set(key, value, ttl=self.local_ttl)
+        return [fetched[key] if value is MISSING else value for key, value in zip(keys, values)]
+
+    async def set_many(self, mapping: Mapping[str, Any], ttl: int = 60) -> None:
+        await self.backend.set_many(mapping, ttl=ttl)
+        self._generation += 1
+        for key, value in mapping.items():
+            self.store.set(key, value, ttl=min(ttl, self.local_ttl) if ttl else self.local_ttl)
+        if self.invalidator is not None and mapping:
+            await self.invalidator.publish("keys", list(mapping))
+
+    async def delete_many(self, keys: Sequence[str]) -> None:
+        await self.backend.delete_many(keys)
+        self._invalidate("keys", keys)
+        if self.invalidator is not None and keys:
+            await self.invalidator.publish("keys", list(keys))
+
+    async def delete_startswith(self, value: str) -> None:
+        await self.backend.delete_startswith(value)
+        self._invalidate("prefix", value)
+        if self.invalidator is not None:
+            await self.invalidator.publish("prefix", value)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        return await self.backend.acquire_lock(key, ttl)
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self.backend.release_lock(key, token)
+
+    async def close(self) -> None:
+        if self.invalidator is not None:
+            await self.invalidator.close()
+        self.store.clear()
+        await self.backend.close()
+
+    def _invalidate(self, op: str, key: str | Sequence[str]) -> None:
+        self._generation += 1
+        if op == "key":
+            self.store.delete(key)
+        elif op == "keys":
+            for k in key:
+                self.store.delete(k)
+        elif op == "prefix":
+            self.store.delete_startswith(key)
+        else:
+            self.store.clear()
@@ -1,35 +1,114 @@
-import pickle
-from typing import Any
+from typing import Any, Mapping, Optional, Sequence
+from uuid import uuid4
 
-import redis
-import ujson
+import redis.asyncio as redis
 
 from core.settings import settings
 
-from .base import BaseBackend
+from .base import BaseBackend, BaseCodec
+from .codec import DefaultCodec
+from .metrics import record_read, record_write
+
+# Deletes the lock only if it is still held by the caller, so an expired lease taken over by another
+# worker is never released by mistake.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 
 class RedisBackend(BaseBackend):
-    def __init__(self):
-        # Redis client bound to pool of connections (auto-reconnecting).
-        self.redis = redis.from_url(settings.REDIS_URL)
+    SCAN_BATCH_SIZE = 1000
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        *,
+        max_connections: Optional[int] = None,
+        pool_timeout: Optional[float] = None,
+        socket_timeout: Optional[float] = None,
+        socket_connect_timeout: Optional[float] = None,
+        health_check_interval: Optional[int] = None,
+        codec: Optional[BaseCodec] = None,
+    ):
+        # Non-blocking client bound to a bounded pool of connections. When the pool is exhausted,
+        # callers wait up to `pool_timeout` seconds for a free connection instead of failing.
+        self.pool = redis.BlockingConnectionPool.from_url(
+            url or settings.REDIS_URL,
+            max_connections=max_connections or settings.REDIS_MAX_CONNECTIONS,
+            timeout=pool_timeout if pool_timeout is not None else settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=socket_timeout if socket_timeout is not None else settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=(
+                socket_connect_timeout if socket_connect_timeout is not None else settings.REDIS_SOCKET_CONNECT_TIMEOUT
+            ),
+            health_check_interval=(
+                health_check_interval if health_check_interval is not None else settings.REDIS_HEALTH_CHECK_INTERVAL
+            ),
+        )
+        self.redis = redis.Redis(connection_pool=self.pool)
+        self.codec = codec or DefaultCodec(
+            serializer=settings.CACHE_SERIALIZER,
+            compression=settings.CACHE_COMPRESSION,
+            compression_threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+        )
+        self._release_lock = self.redis.register_script(RELEASE_LOCK_SCRIPT)
 
     async def get_(self, key: str) -> Any:
-        response = self.redis.get(key)
-        if not response:
-            return
-        try:
-            return ujson.loads(response.decode("utf8"))
-        except UnicodeDecodeError:
-            return pickle.loads(response)
+        return self._decode(key, await self.redis.get(key))
 
     async def set_(self, key: str, value: Any, ttl: int = 60) -> None:
-        if isinstance(value, dict):
-            value = ujson.dumps(value)
-        elif isinstance(value, object):
-            value = pickle.dumps(value)
-        self.redis.set(key, value, ex=ttl)
+        await self.redis.set(key, self._encode(key, value), ex=ttl)
+
+    async def get_many(self, keys: Sequence[str]) -> list[Any]:
+        if not keys:
+            return []
+        return [self._decode(key, response) for key, response in zip(keys, await self.redis.mget(keys))]
+
+    async def set_many(self, mapping: Mapping[str, Any], ttl: int = 60) -> None:
+        if not mapping:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, self._encode(key, value), ex=ttl)
+            await pipe.execute()
+
+    async def delete_many(self, keys: Sequence[str]) -> None:
+        if keys:
+            await self.redis.unlink(*keys)
 
     async def delete_startswith(self, value: str):
-        for k in self.redis.scan_iter(f"{value}*"):
-            self.redis.delete(k)
+        # Prefer tag invalidation: this walks the whole keyspace. Keys are unlinked in batches so that
+        # at least the deletion itself costs one round trip per batch rather than one per key.
+        batch = []
+        async for k in self.redis.scan_iter(match=f"{value}*", count=self.SCAN_BATCH_SIZE):
+            batch.append(k)
+            if len(batch) >= self.SCAN_BATCH_SIZE:
+                await self.redis.unlink(*batch)
+                batch.clear()
+        if batch:
+            await self.redis.unlink(*batch)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid4().hex
+        acquired = await self.redis.set(key, token, nx=True, px=int(ttl * 1000))
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self._release_lock(keys=[key], args=[token])
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+        await self.pool.disconnect()
+
+    def _encode(self, key: str, value: Any) -> bytes:
+        data = self.codec.encode(value)
+        record_write(key, data)
+        return data
+
+    def _decode(self, key: str, response: Optional[bytes]) -> Any:
+        if response is None:
+            return
+        record_read(key, response)
+        return self.codec.decode(response)
@@ -1,8 +1,8 @@
-from typing import Any, Generic, Optional, Sequence, Type, TypeVar
+from typing import Any, AsyncIterator, Callable, Generic, Literal, Optional, Sequence, Type, TypeVar
 
 from core.db import Base, Transactional
 from core.exceptions import NotFoundException
-from core.repository import BaseRepository
+from core.repository import BaseRepository, CursorPage, Page, UpsertResult
 from core.repository.enum import SynchronizeSessionEnum
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -37,6 +37,7 @@ class BaseController(Generic[ModelType]):
         order_: Optional[dict] = None,
         where_: Optional[list] = None,
         group_by_: Optional[list] = None,
+        as_: Optional[Callable[..., Any]] = None,
     ):
         """
         Returns a list of records based on pagination params.
@@ -50,9 +51,81 @@ class BaseController(Generic[ModelType]):
             order_=order_,
             where_=where_,
             group_by_=group_by_,
+            as_=as_,
         )
         return response
 
+    async def exists(self, where_: Optional[list] = None) -> bool:
+        """
+        Returns whether any record matches the conditions.
+        """
+        return await self.repository.exists(where_=where_)
+
+    async def get_page(
+        self,
+        skip: int = 0,
+        limit: int = 50,
+        *,
+        join_: Optional[set[str]] = None,
+        order_: Optional[dict] = None,
+        where_: Optional[list] = None,
+        count: Literal["exact", "estimated"] = "exact",
+    ) -> Page[ModelType]:
+        """
+        Returns a page of records and the total number of matching records, in one query.
+        """
+        return await self.repository.get_page(
+            skip=skip,
+            limit=limit,
+            join_=join_,
+            order_=order_,
+            where_=where_,
+            count=count,
+        )
+
+    async def stream_many(
+        self,
+        *,
+        batch_size: int = 1000,
+        fields: Optional[list] = None,
+        join_: Optional[set[str]] = None,
+        order_: Optional[dict] = None,
+        where_: Optional[list] = None,
+    ) -> AsyncIterator[ModelType]:
+        """
+        Yields the matching records in batches of `batch_size`, e.g. to feed `ndjson_stream` or `csv_stream`.
+        """
+        async for item in self.repository.stream_many(
+            batch_size=batch_size,
+            fields=fields,
+            join_=join_,
+            order_=order_,
+            where_=where_,
+        ):
+            yield item
+
+    async def paginate(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        *,
+        order_by: str = "id",
+        desc: bool = False,
+        join_: Optional[set[str]] = None,
+        where_: Optional[list] = None,
+    ) -> CursorPage[ModelType]:
+        """
+        Returns a page of records after (or before) a cursor, along with the cursors of the neighbouring pages.
+        """
+        return await self.repository.paginate(
+            limit=limit,
+            cursor=cursor,
+            order_by=order_by,
+            desc=desc,
+            join_=join_,
+            where_=where_,
+        )
+
     @Transactional()
     async def create(self, attributes: dict[str, Any]) -> ModelType:
         """
@@ -62,20 +135,33 @@ class BaseController(Generic[ModelType]):
         return create
 
     @Transactional()
-    async def create_many(self, attributes_list: list[dict[str, Any]]) -> Sequence[ModelType]:
+    async def create_many(
+        self, attributes_list: list[dict[str, Any]], *, returning: bool = True
+    ) -> Sequence[ModelType] | int:
         """
-        Create multiple objects in the DB.
+        Create multiple objects in the DB. Without `returning`, only the number of rows is returned.
         """
-        creates = await self.repository.create_many(attributes_list)
+        creates = await self.repository.create_many(attributes_list, returning=returning)
         return creates
 
+    @Transactional()
+    async def update_many(
+        self, attributes_list: list[dict[str, Any]], key: str | Sequence[str] = "id", *, returning: bool = False
+    ) -> Sequence[ModelType] | int:
+        """
+        Updates many objects in the DB, each with its own values, identified by `key`.
+        """
+        return await self.repository.update_many(attributes_list, key, returning=returning)
+
     @Transactional()
     async def upsert(self, index_elements: list[str], attributes: dict[str, Any]) -> Optional[ModelType]:
         return await self.repository.upsert(index_elements, attributes)
 
     @Transactional()
-    async def upsert_many(self, index_elements: list[str], attributes_list: list[dict[str, Any]]):
-        return await self.repository.upsert_many(index_elements, attributes_list)
+    async def upsert_many(
+        self, index_elements: list[str], attributes_list: list[dict[str, Any]], *, returning: bool = True
+    ) -> Sequence[ModelType] | UpsertResult:
+        return await self.repository.upsert_many(index_elements, attributes_list, returning=returning)
 
     @Transactional()
     async def delete(
@@ -83,9 +169,18 @@ class BaseController(Generic[ModelType]):
         where_: Optional[list] = None,
         *,
         synchronize_session: SynchronizeSessionEnum = SynchronizeSessionEnum.FALSE,
-    ) -> None:
+        returning: bool = True,
+    ) -> Sequence[ModelType] | int:
         """
-        Deletes the Object from the DB.
+        Deletes the Object from the DB. Without `returning`, only the number of rows is returned.
         """
-        delete = await self.repository.delete(where_=where_, synchronize_session=synchronize_session)
+        delete = await self.repository.delete(
+            where_=where_, synchronize_session=synchronize_session, returning=returning
+        )
         return delete
+
+    async def delete_in_batches(self, where_: Optional[list] = None, *, batch_size: int = 1000) -> int:
+        """
+        Deletes the matching Objects in batches of `batch_size`, committing after each one.
+        """
+        return await self.repository.delete_in_batches(where_=where_, batch_size=batch_size)
@@ -1,6 +1,5 @@
 from functools import wraps
 from typing import Awaitable, Callable, TypeVar
-from uuid import uuid4
 
 from typing_extensions import ParamSpec
 
@@ -25,9 +24,12 @@ class Transactional:
 
             try:
                 result = await fn(*args, **kwargs)
-                await db_session_keeper.session.commit()
+                # Nothing to commit when no statement was executed.
+                if db_session_keeper.has_session():
+                    await db_session_keeper.session.commit()
             except Exception as e:
-                await db_session_keeper.session.rollback()
+                if db_session_keeper.has_session():
+                    await db_session_keeper.session.rollback()
                 raise e
 
             return result
@@ -40,7 +42,7 @@ def session_scope(dialect: Dialect):
         @wraps(fn)
         async def wrapper(*args, **kwargs):
             db_session_keeper = DB_MANAGER[dialect]
-            session_id = str(uuid4())
+            session_id = db_session_keeper.new_session_id()
             context = db_session_keeper.set_session_context(session_id=session_id)
             try:
                 return await fn(*args, **kwargs)
@@ -0,0 +1,51 @@
+from sqlalchemy import event
+from sqlalchemy.engine.default import CacheStats
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.metrics import Metrics
+
+COMPILED_CACHE = Metrics.counter(
+    "db_compiled_cache",
+    "Statements executed by engine and compiled cache result (hit, miss, disabled, no_key, unsupported).",
+    labels=["engine", "result"],
+)
+COMPILED_CACHE_SIZE = Metrics.gauge("db_compiled_cache_size", "Compiled statements held by engine.", labels=["engine"])
+
+POOL_CHECKED_OUT = Metrics.gauge(
+    "db_pool_checked_out", "Connections currently checked out, by engine.", labels=["engine"]
+)
+POOL_WAIT = Metrics.histogram(
+    "db_pool_wait_seconds",
+    "Time taken to get a connection from the pool, including opening a new one.",
+    labels=["engine"],
+)
+POOL_OVERFLOWS = Metrics.counter(
+    "db_pool_overflows", "Connections opened beyond pool_size, by engine.", labels=["engine"]
+)
+POOL_TIMEOUTS = Metrics.counter(
+    "db_pool_timeouts", "Requests for a connection that gave up after pool_timeout, by engine.", labels=["engine"]
+)
+
+_RESULTS = {
+    CacheStats.CACHE_HIT: "hit",
+    CacheStats.CACHE_MISS: "miss",
+    CacheStats.CACHING_DISABLED: "disabled",
+    CacheStats.NO_CACHE_KEY: "no_key",
+    CacheStats.NO_DIALECT_SUPPORT: "unsupported",
+}
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """
+    Count, for every statement `engine` executes, whether its compiled form came from the compiled cache.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is None:
+            return
+        COMPILED_CACHE.inc(engine=name, result=_RESULTS.get(context.cache_hit, "no_key"))
+        cache = getattr(sync_engine, "_compiled_cache", None)
+        if cache is not None:
+            COMPILED_CACHE_SIZE.set(len(cache), engine=name)
@@ -0,0 +1,33 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from .metrics import POOL_CHECKED_OUT, POOL_OVERFLOWS, POOL_TIMEOUTS, POOL_WAIT
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    An `AsyncAdaptedQueuePool` reporting checkouts, wait time, overflow connections and timeouts, labelled with
+    its `pool_logging_name`.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        name = self._orig_logging_name or "default"
+        overflow = self.overflow()
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc(engine=name)
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, engine=name)
+        if self.overflow() > max(overflow, 0):
+            POOL_OVERFLOWS.inc(engine=name)
+        POOL_CHECKED_OUT.set(self.checkedout(), engine=name)
+        return record
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        POOL_CHECKED_OUT.set(self.checkedout(), engine=self._orig_logging_name or "default")
@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.logger import syslog
+from core.metrics import Metrics
+
+REPLICA_LAG = Metrics.gauge(
+    "db_replica_lag_seconds", "Replication lag measured by the last health check.", labels=["replica"]
+)
+REPLICA_HEALTHY = Metrics.gauge("db_replica_healthy", "Whether the replica currently serves reads.", labels=["replica"])
+
+# Zero when the replica has replayed everything it received, so an idle primary does not read as lag.
+LAG_QUERY = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+@dataclass(slots=True)
+class WriteClock:
+    """
+    When the client of the current request last committed writes (a `time.time()` value), and whether this
+    request did, so that the new time can be handed back to the client.
+    """
+
+    written_at: Optional[float] = None
+    changed: bool = False
+
+
+write_clock: ContextVar[Optional[WriteClock]] = ContextVar("write_clock", default=None)
+
+
+def mark_written() -> None:
+    """
+    Record that the current client committed writes; outside of a request with a `WriteClock`, nothing is recorded.
+    """
+    clock = write_clock.get()
+    if clock is not None:
+        clock.written_at = time.time()
+        clock.changed = True
+
+
+class ReplicaSet:
+    """
+    The engines that serve reads, handed out round robin among those that passed their last health check.
+
+    Replicas that cannot be reached, or lag behind the primary by more than `max_lag` seconds, are skipped until
+    a later check finds them healthy again; with none left, reads go to the `primary`. For `window` seconds after
+    a client commits writes, as told by the `WriteClock` of its requests, its reads go to the primary as well, so
+    that it can read back what it wrote.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: Sequence[AsyncEngine],
+        *,
+        max_lag: float = 10.0,
+        check_interval: float = 5.0,
+        check_timeout: float = 2.0,
+        window: float = 0.0,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.window = window
+        self._healthy = list(self.replicas)
+        self._cycle = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> AsyncEngine:
+        if not self._healthy or self._recently_written():
+            return self.primary
+        healthy = self._healthy
+        return healthy[next(self._cycle) % len(healthy)]
+
+    def _recently_written(self) -> bool:
+        clock = write_clock.get()
+        return clock is not None and clock.written_at is not None and time.time() - clock.written_at < self.window
+
+    async def check(self) -> None:
+        """
+        Measure the lag of every replica and keep those within `max_lag` for the following reads.
+        """
+        lags = await asyncio.gather(*(self._lag(replica) for replica in self.replicas))
+        healthy = []
+        for replica, lag in zip(self.replicas, lags):
+            name = _name(replica)
+            ok = lag is not None and lag <= self.max_lag
+            if lag is not None:
+                REPLICA_LAG.set(lag, replica=name)
+            REPLICA_HEALTHY.set(int(ok), replica=name)
+            if ok:
+                healthy.append(replica)
+            elif replica in self._healthy:
+                syslog.warning(f"Replica {name} removed from reads (lag: {lag})")
+        self._healthy = healthy
+
+    async def _lag(self, replica: AsyncEngine) -> Optional[float]:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with replica.connect() as connection:
+                    return float(await connection.scalar(LAG_QUERY))
+        except Exception as e:
+            syslog.error(f"Replica {_name(replica)} health check failed: {e}")
+            return None
+
+    def start(self) -> None:
+        if self._task is None and self.replicas:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+
+def _name(engine: AsyncEngine) -> str:
+    url = engine.url
+    host = url.host or url.query.get("host") or "localhost"
+    return f"{host}:{url.port or 5432}/{url.database}"
@@ -1,16 +1,30 @@
+import asyncio
+import itertools
 from collections import deque
 from contextvars import ContextVar, Token
 from enum import Enum
+from functools import partial
 from typing import Any, Optional
 from uuid import uuid4
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker, create_async_engine
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase, Session
 from sqlalchemy.pool import NullPool
 from sqlalchemy.sql.expression import Delete, Insert, Update
 
 from core.settings import settings
 
+from .metrics import instrument_engine
+from .pool import InstrumentedPool
+from .replicas import ReplicaSet, mark_written
+
 
 class EngineType(Enum):
     WRITER = "writer"
@@ -18,43 +32,189 @@ class EngineType(Enum):
 
 
 class RoutingSession(Session):
-    def __init__(self, engines, *args, **kwargs):
+    """
+    Sends writes, and every statement of a session that has written, to the writer, and other reads to a replica.
+    """
+
+    def __init__(self, keeper: "DBSessionKeeper", *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.engines = engines
+        self.keeper = keeper
+        self._wrote = False
+        self._reader = None
 
     def get_bind(self, mapper=None, clause=None, **kw):
         if self._flushing or isinstance(clause, (Update, Delete, Insert)):
-            return self.engines[EngineType.WRITER].sync_engine
-        else:
-            return self.engines[EngineType.READER].sync_engine
+            self._wrote = True
+        if self._wrote:
+            return self.keeper.engine(EngineType.WRITER).sync_engine
+        if self._reader is None:
+            # One replica per session, so its reads share a connection and see the same replica state.
+            self._reader = self.keeper.replicas.choose()
+        return self._reader.sync_engine
+
+    def commit(self) -> None:
+        super().commit()
+        if self._wrote:
+            mark_written()
+
+    def close(self) -> None:
+        super().close()
+        self._wrote = False
+        self._reader = None
+
+
+def create_engine(
+    database_uri: str, role: EngineType, *, testing: bool = False, name: Optional[str] = None
+) -> AsyncEngine:
+    """
+    Create an engine with the pool and timeout settings of `role`, reporting metrics as `name` (the role by default).
+    """
+    name = name or role.value
+    engine = create_async_engine(database_uri, pool_logging_name=name, **_engine_options(database_uri, role, testing))
+    instrument_engine(engine, name)
+    return engine
+
+
+def _engine_options(database_uri: str, role: EngineType, testing: bool) -> dict[str, Any]:
+    if testing:
+        return {"poolclass": NullPool}
+    option = partial(_role_setting, role)
+    connect_args = {}
+    timeouts = {
+        "statement_timeout": option("STATEMENT_TIMEOUT"),
+        "idle_in_transaction_session_timeout": option("IDLE_IN_TRANSACTION_TIMEOUT"),
+    }
+    # Unset timeouts are not sent, so that those of the database role, if any, apply.
+    server_settings = {name: _milliseconds(seconds) for name, seconds in timeouts.items() if seconds}
+    if make_url(database_uri).get_driver_name() == "asyncpg":
+        if settings.SQLALCHEMY_PGBOUNCER:
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=_prepared_statement_name,
+            )
+        elif server_settings:
+            connect_args["server_settings"] = server_settings
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": option("POOL_SIZE"),
+        "max_overflow": option("MAX_OVERFLOW"),
+        "pool_timeout": option("POOL_TIMEOUT"),
+        "pool_pre_ping": option("POOL_PRE_PING"),
+        "pool_recycle": option("POOL_RECYCLE"),
+        "connect_args": connect_args,
+    }
+
+
+def _role_setting(role: EngineType, name: str) -> Any:
+    return getattr(settings, f"SQLALCHEMY_{role.name}_{name}")
+
+
+def _milliseconds(seconds: float) -> str:
+    return str(int(seconds * 1000))
+
+
+def _prepared_statement_name() -> str:
+    # Behind PgBouncer, consecutive transactions may run on different server connections, where a statement
+    # prepared under a reused name could already exist or mean something else.
+    return f"__asyncpg_{uuid4().hex}__"
+
+
+class EngineRegistry:
+    """
+    Engines created on first use and shared by every role and session keeper asking for the same URL with the same
+    pool configuration, so that each worker holds one pool per distinct database and configuration.
+    """
+
+    def __init__(self):
+        self._engines: dict[tuple[str, str], AsyncEngine] = {}
+
+    def get(
+        self, database_uri: str, role: EngineType, *, testing: bool = False, name: Optional[str] = None
+    ) -> AsyncEngine:
+        key = (database_uri, repr(_engine_options(database_uri, role, testing)))
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = self._engines[key] = create_engine(database_uri, role, testing=testing, name=name)
+        return engine
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    async def dispose(self) -> None:
+        """
+        Close the connections of every engine; engines asked for afterwards are created anew.
+        """
+        engines = list(self._engines.values())
+        self._engines.clear()
+        await asyncio.gather(*(engine.dispose() for engine in engines))
+
+
+ENGINES = EngineRegistry()
 
 
 class DBSessionKeeper:
-    def __init__(self, database_uri: str, testing=settings.PYTEST):
+    def __init__(
+        self,
+        database_uri: str,
+        testing=settings.PYTEST,
+        reader_uris: Optional[list[str]] = None,
+    ):
         self.session_context: ContextVar[str] = ContextVar(str(uuid4()))
-
-        if not testing:
-            self.engines = {
-                EngineType.WRITER: create_async_engine(database_uri, pool_recycle=3600),
-                EngineType.READER: create_async_engine(database_uri, pool_recycle=3600),
-            }
-        else:
-            self.engines = {
-                EngineType.WRITER: create_async_engine(database_uri, poolclass=NullPool),
-                EngineType.READER: create_async_engine(database_uri, poolclass=NullPool),
-            }
+        self._session_ids = itertools.count()
+        self.database_uri = database_uri
+        self.reader_uris = list(reader_uris or [])
+        self.testing = testing
+        # Engines and replicas are only looked up from `ENGINES` once a session needs them.
+        self._engines: dict[EngineType, AsyncEngine] = {}
+        self._replicas: Optional[ReplicaSet] = None
 
         self.async_session_factory = async_sessionmaker(
             class_=AsyncSession,
             sync_session_class=RoutingSession,
             expire_on_commit=False,
-            engines=self.engines,
+            keeper=self,
         )
         self._session = async_scoped_session(
             session_factory=self.async_session_factory,
             scopefunc=self.get_session_context,
         )
 
+    def engine(self, role: EngineType) -> AsyncEngine:
+        engine = self._engines.get(role)
+        if engine is None:
+            engine = self._engines[role] = ENGINES.get(self.database_uri, role, testing=self.testing)
+        return engine
+
+    @property
+    def replicas(self) -> ReplicaSet:
+        if self._replicas is None:
+            readers = [
+                ENGINES.get(uri, EngineType.READER, testing=self.testing, name=f"replica{i}")
+                for i, uri in enumerate(self.reader_uris)
+            ]
+            self._replicas = ReplicaSet(
+                self.engine(EngineType.WRITER),
+                readers or [self.engine(EngineType.READER)],
+                max_lag=settings.SQLALCHEMY_REPLICA_MAX_LAG,
+                check_interval=settings.SQLALCHEMY_REPLICA_CHECK_INTERVAL,
+                window=settings.SQLALCHEMY_READ_YOUR_WRITES_WINDOW if readers else 0,
+            )
+        return self._replicas
+
+    def start(self) -> None:
+        """
+        Start the replica health checks, when there are replicas; needs a running event loop.
+        """
+        if self.reader_uris:
+            self.replicas.start()
+
+    async def close(self) -> None:
+        if self._replicas is not None:
+            await self._replicas.close()
+        self._replicas = None
+        self._engines.clear()
+
     @property
     def session(self) -> async_scoped_session[AsyncSession]:
         return self._session
@@ -62,6 +222,25 @@ class DBSessionKeeper:
     def get_session_context(self) -> str:
         return self.session_context.get()
 
+    def new_session_id(self) -> str:
+        """
+        A session scope id unique within the process, cheaper than a UUID.
+        """
+        return str(next(self._session_ids))
+
+    @property
+    def tracks_writes(self) -> bool:
+        """
+        Whether reads go to replicas and clients must be kept on the primary for a while after they write.
+        """
+        return bool(self.reader_uris) and settings.SQLALCHEMY_READ_YOUR_WRITES_WINDOW > 0
+
+    def has_session(self) -> bool:
+        """
+        Whether a session was created in the current scope; sessions are only created when first used.
+        """
+        return self._session.registry.has()
+
     def set_session_context(self, session_id: str) -> Token:
         return self.session_context.set(session_id)
 
@@ -75,7 +254,8 @@ class DBSessionKeeper:
         try:
             yield self.session
         finally:
-            await self.session.close()
+            if self.has_session():
+                await self.session.close()
 
 
 """
@@ -89,7 +269,7 @@ class Dialect(str, Enum):
 
 
 DB_MANAGER = {
-    Dialect.POSTGRES: DBSessionKeeper(settings.SQLALCHEMY_POSTGRES_URI),
+    Dialect.POSTGRES: DBSessionKeeper(settings.SQLALCHEMY_POSTGRES_URI, reader_uris=settings.SQLALCHEMY_READER_URIS),
     Dialect.AUTH_POSTGERS: DBSessionKeeper(settings.SQLALCHEMY_POSTGRES_URI),
 }
 
@@ -219,4 +399,3 @@ class Base(DeclarativeBase):
                     current_dict[key] = value
 
         return result
-
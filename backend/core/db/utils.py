@@ -1,7 +1,6 @@
 import asyncio
 from contextlib import asynccontextmanager
 from typing import TypeVar
-from uuid import uuid4
 
 from .session import Base, DBSessionKeeper
 
@@ -17,7 +16,7 @@ async def session_context(db_session: DBSessionKeeper):
         db_session (DBSession): The database session object that manages
         session lifecycle and transaction handling.
     """
-    context = db_session.set_session_context(str(uuid4()))
+    context = db_session.set_session_context(db_session.new_session_id())
 
     session_generator = db_session.get_session()
     session = None
@@ -25,11 +24,11 @@ async def session_context(db_session: DBSessionKeeper):
         async for session in session_generator:
             yield session
     except asyncio.CancelledError:
-        if session is not None:
+        if session is not None and db_session.has_session():
             await session.rollback()
         raise
     except Exception:
-        if session is not None:
+        if session is not None and db_session.has_session():
             await session.rollback()
         raise
     finally:
@@ -1,23 +1,67 @@
-from uuid import uuid4
+import math
 
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from core.db.replicas import WriteClock, write_clock
 from core.db.session import DB_MANAGER, Dialect
+from core.settings import settings
 
 
 class SQLAlchemyMiddleware:
+    """
+    Gives each request its own session scope. The session itself is only created when a repository or
+    `Transactional` first uses it, so requests that never touch the database do not open one or close one.
+
+    With read replicas, the time of the client's last write is read from and written back to a cookie, so that
+    the client's reads stay on the primary for a while after it writes, whichever worker serves them.
+    """
+
     def __init__(self, app: ASGIApp) -> None:
         self.app = app
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
         db_session_handler = DB_MANAGER[Dialect.POSTGRES]
-        session_id = str(uuid4())
-        context = db_session_handler.set_session_context(session_id=session_id)
+        context = db_session_handler.set_session_context(session_id=db_session_handler.new_session_id())
+        clock_context = None
+        if db_session_handler.tracks_writes:
+            clock = _read_clock(scope)
+            clock_context = write_clock.set(clock)
+            send = _clock_sender(send, clock)
 
         try:
             await self.app(scope, receive, send)
-        except Exception as e:
-            raise e
         finally:
-            await db_session_handler.session.remove()
+            if db_session_handler.has_session():
+                await db_session_handler.session.remove()
             db_session_handler.reset_session_context(context=context)
+            if clock_context is not None:
+                write_clock.reset(clock_context)
+
+
+def _read_clock(scope: Scope) -> WriteClock:
+    value = HTTPConnection(scope).cookies.get(settings.SQLALCHEMY_READ_YOUR_WRITES_COOKIE)
+    try:
+        return WriteClock(written_at=float(value) if value else None)
+    except ValueError:
+        return WriteClock()
+
+
+def _clock_sender(send: Send, clock: WriteClock) -> Send:
+    async def send_with_clock(message: Message) -> None:
+        # Writes committed after the response has started cannot be reported to the client.
+        if message["type"] == "http.response.start" and clock.changed:
+            max_age = math.ceil(settings.SQLALCHEMY_READ_YOUR_WRITES_WINDOW)
+            MutableHeaders(scope=message).append(
+                "set-cookie",
+                f"{settings.SQLALCHEMY_READ_YOUR_WRITES_COOKIE}={clock.written_at:.3f}; "
+                f"Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax",
+            )
+        await send(message)
+
+    return send_with_clock
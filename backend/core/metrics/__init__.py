@@ -0,0 +1,5 @@
+from .registry import Counter, Gauge, Histogram, MetricsRegistry
+
+Metrics = MetricsRegistry()
+
+__all__ = ["Counter", "Gauge", "Histogram", "Metrics", "MetricsRegistry"]
@@ -0,0 +1,201 @@
+import bisect
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Optional, Sequence
+
+# Latency buckets, in seconds, from half a millisecond to ten seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(ABC):
+    """
+    A named family of time series, one per combination of label values.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"Metric {self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _series(self, suffix: str, key: tuple[str, ...], value: float, extra: Iterable[tuple[str, str]] = ()) -> str:
+        pairs = [*zip(self.labels, key), *extra]
+        labels = ",".join(f'{name}="{_escape(v)}"' for name, v in pairs)
+        return (
+            f"{self.name}{suffix}{{{labels}}} {_format_value(value)}"
+            if labels
+            else f"{self.name}{suffix} {_format_value(value)}"
+        )
+
+    @abstractmethod
+    def collect(self) -> list[str]: ...
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.collect()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [self._series("_total", key, value) for key, value in values]
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. With `fn`, the value is read from it at collection time instead.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), fn: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation, labels)
+        self.fn = fn
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        if self.fn is not None:
+            return self.fn()
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        if self.fn is not None:
+            return [self._series("", (), self.fn())]
+        with self._lock:
+            values = list(self._values.items())
+        return [self._series("", key, value) for key, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: the count of each bucket (not cumulative, the last one is +Inf), then the sum.
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(series)) for key, series in self._values.items()]
+        lines = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series):
+                cumulative += count
+                lines.append(self._series("_bucket", key, cumulative, (("le", _format_value(float(bound))),)))
+            lines.append(self._series("_sum", key, series[-1]))
+            lines.append(self._series("_count", key, cumulative))
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process registry of metrics, rendered in the Prometheus text exposition format.
+
+    Metrics are registered once, by name; registering an existing name returns the same metric.
+    Values are kept per process, so each worker exposes its own and the scraper aggregates them.
+
+    Usage:
+        requests = Metrics.counter("http_requests", "Handled requests.", labels=["route"])
+        requests.inc(route="/ping")
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(
+        self, name: str, documentation: str, labels: Sequence[str] = (), fn: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        return self._register(Gauge, name, documentation, labels, fn=fn)
+
+    def histogram(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def _register(self, cls: type[Metric], name: str, documentation: str, labels: Sequence[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
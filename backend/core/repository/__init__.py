@@ -1,7 +1,12 @@
 from .base import BaseRepository
 from .enum import SynchronizeSessionEnum
+from .pagination import CursorPage, Page
+from .results import UpsertResult
 
 __all__ = [
     "BaseRepository",
+    "CursorPage",
+    "Page",
     "SynchronizeSessionEnum",
+    "UpsertResult",
 ]
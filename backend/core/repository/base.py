@@ -1,45 +1,117 @@
+import asyncio
 import traceback
+from contextlib import aclosing
+from datetime import datetime, timezone
 from functools import reduce, wraps
-from typing import Any, Awaitable, Callable, Dict, Generic, Optional, ParamSpec, Sequence, Type, TypeVar
-
-from sqlalchemy import Select, delete, func, inspect, select, update
-from sqlalchemy.dialects.postgresql import insert
+from inspect import isasyncgenfunction
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Literal,
+    Optional,
+    ParamSpec,
+    Sequence,
+    Type,
+    TypeVar,
+)
+from uuid import uuid4
+
+from sqlalchemy import (
+    Row,
+    Select,
+    and_,
+    bindparam,
+    column,
+    delete,
+    func,
+    inspect,
+    literal_column,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import functions
 
+import core.utils as ut
 from core.db import Base
 from core.exceptions import SystemException
 from core.logger import syslog
 
 from .enum import SynchronizeSessionEnum
+from .explain import Explain
+from .pagination import Cursor, CursorPage, Page
+from .results import UpsertResult
 
 ModelType = TypeVar("ModelType", bound=Base)
+T = TypeVar("T")
 
 P = ParamSpec("P")
 R = TypeVar("R")
 
 
 def safeguard_db_ops():
-    """A decorator to safeguard database operations and handle exceptions."""
+    """A decorator to safeguard database operations and handle exceptions.
+
+    Works on coroutines and on async generators alike."""
 
     def decorator(fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        if isasyncgenfunction(fn):
+
+            @wraps(fn)
+            async def stream_wrapper(*args: P.args, **kwargs: P.kwargs):
+                try:
+                    # Closing the inner generator as well when the caller stops early releases its result cursor.
+                    async with aclosing(fn(*args, **kwargs)) as stream:
+                        async for item in stream:
+                            yield item
+                except SQLAlchemyError as e:
+                    _raise_db_error(e)
+
+            return stream_wrapper
+
         @wraps(fn)
         async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
             try:
                 return await fn(*args, **kwargs)
             except SQLAlchemyError as e:
-                msg = f"An error occurred while executing the database operation: {e}"
-                syslog.error(msg)
-                traceback.print_exc()
-                raise SystemException(msg)
+                _raise_db_error(e)
 
         return wrapper
 
     return decorator
 
 
+def _raise_db_error(e: SQLAlchemyError):
+    msg = f"An error occurred while executing the database operation: {e}"
+    syslog.error(msg)
+    traceback.print_exc()
+    raise SystemException(msg)
+
+
+def _project(rows: Iterable[Row], as_: Callable[..., T]) -> list[T]:
+    return [as_(**row._mapping) for row in rows]
+
+
 class BaseRepository(Generic[ModelType]):
+    # Postgres rejects statements with more bind parameters than this.
+    MAX_BIND_PARAMS = 32767
+    # Batches at least this large are loaded with COPY when no rows need to be returned.
+    COPY_THRESHOLD = 5000
+    # Upserts of at least this many rows are merged from a staging table loaded with COPY.
+    STAGING_THRESHOLD = 10_000
+    # Rows per statement for bulk updates, whose values are bound as arrays.
+    UPDATE_CHUNK_SIZE = 10_000
+
     def __init__(self, model: Type[ModelType], db_session: AsyncSession):
         self.session = db_session
         self.model_class = model
@@ -305,27 +377,175 @@ class BaseRepository(Generic[ModelType]):
         return model
 
     @safeguard_db_ops()
-    async def create_many(self, attributes_list: list[dict[str, Any]], commit=False) -> Sequence[ModelType]:
+    async def create_many(
+        self,
+        attributes_list: list[dict[str, Any]],
+        commit=False,
+        *,
+        returning: bool = True,
+        chunk_size: Optional[int] = None,
+        copy: Optional[bool] = None,
+    ) -> Sequence[ModelType] | int:
         """Creates multiple model instances and adds them to the database.
 
+        Rows are inserted in chunks that stay under the bind parameter limit. Without `returning`,
+        nothing is read back: chunks go through an executemany `INSERT`, and large batches through
+        `COPY`, which skips SQL parsing and ORM hydration altogether.
+
         Args:
             attributes_list (list[dict[str, Any]]): A list of dictionaries, where each dictionary
                 contains the attributes for one model instance.
             commit (bool): Whether to commit the transaction after creation. Defaults to False.
+            returning (bool): Whether to return the created instances. Defaults to True.
+            chunk_size (Optional[int]): The number of rows per statement. Defaults to as many as the
+                bind parameter limit allows.
+            copy (Optional[bool]): Whether to use `COPY` when `returning` is False. Defaults to batches
+                of at least `COPY_THRESHOLD` rows. Only available with asyncpg, and when the column
+                defaults that `COPY` would skip can be computed in Python.
 
         Returns:
-            Sequence[ModelType]: A list of the created model instances.
+            Sequence[ModelType] | int: A list of the created model instances, or the number of rows
+                inserted when `returning` is False.
         """
-        stmt = insert(self.model_class).values(attributes_list).returning(self.model_class)
-        result = await self.session.execute(stmt)
-        created_instances = result.scalars().all()
+        if not attributes_list:
+            return [] if returning else 0
+
+        chunk_size = chunk_size or self._chunk_size()
 
-        for isntance in created_instances:
-            self.session.add(isntance)
+        if returning:
+            result = []
+            for chunk in ut.chunked(attributes_list, chunk_size):
+                stmt = insert(self.model_class).values(list(chunk)).returning(self.model_class)
+                result.extend((await self.session.execute(stmt)).scalars().all())
+        else:
+            if copy is None:
+                copy = len(attributes_list) >= self.COPY_THRESHOLD
+            # Each COPY, like each executemany statement, takes a single column list, so rows are
+            # inserted in groups that provide the same attributes.
+            shapes = self._group_by_keys(attributes_list)
+            plans = self._copy_plans(shapes) if copy and self._supports_copy() else None
+            if plans is not None:
+                for rows, keys, defaults in plans:
+                    await self._copy(rows, keys, defaults)
+            else:
+                for shape in shapes:
+                    for chunk in ut.chunked(shape, chunk_size):
+                        await self.session.execute(insert(self.model_class), list(chunk))
+            result = len(attributes_list)
 
         if commit:
             await self.session.commit()
-        return created_instances
+        return result
+
+    @staticmethod
+    def _keys_of(attributes_list: list[dict[str, Any]]) -> list[str]:
+        """The union of the keys of all the rows, in order of appearance."""
+        return list(dict.fromkeys(key for attributes in attributes_list for key in attributes))
+
+    def _chunk_size(self) -> int:
+        """The number of rows per statement that keeps the bind parameters under the limit."""
+        # Columns left out of the rows can still be bound, with their client-side defaults.
+        return max(self.MAX_BIND_PARAMS // len(self.model_class.__table__.columns), 1)
+
+    def _supports_copy(self) -> bool:
+        return self.session.get_bind(clause=insert(self.model_class)).dialect.driver == "asyncpg"
+
+    def _copy_plans(
+        self, shapes: list[list[dict[str, Any]]]
+    ) -> Optional[list[tuple[list[dict[str, Any]], list[str], dict[str, Callable[[], Any]]]]]:
+        """The rows, keys and defaults to `COPY` for each group of rows, or `None` if a group cannot be copied."""
+        plans = []
+        for rows in shapes:
+            keys = list(rows[0])
+            defaults = self._copy_defaults(rows, keys)
+            if defaults is None:
+                return None
+            plans.append((rows, keys, defaults))
+        return plans
+
+    def _copy_defaults(
+        self, attributes_list: list[dict[str, Any]], keys: list[str]
+    ) -> Optional[dict[str, Callable[[], Any]]]:
+        """
+        Python equivalents of the client-side column defaults, which `COPY` does not apply.
+
+        Server-side defaults are applied by `COPY` only to the columns that no row provides. Returns
+        `None` when a row leaves out a column whose default cannot be computed in Python, e.g. a
+        sequence or an arbitrary SQL expression, or a column with no client-side default that other
+        rows provide, as `COPY` would write NULL into it.
+        """
+        provided = set(keys)
+        partial = {key for key in keys if any(key not in attributes for attributes in attributes_list)}
+        now = datetime.now(timezone.utc)
+
+        defaults = {}
+        for key, mapped in inspect(self.model_class).columns.items():
+            if key in provided and key not in partial:
+                continue
+            default = mapped.default
+            if default is None:
+                if key in partial:
+                    return None
+                continue
+            if default.is_sequence:
+                return None
+            if default.is_scalar:
+                defaults[key] = lambda value=default.arg: value
+            elif default.is_callable:
+                defaults[key] = lambda fn=default.arg: fn(None)
+            elif isinstance(default.arg, functions.now):
+                # `now()` is the start time of the transaction: one value for the whole batch.
+                defaults[key] = lambda: now
+            else:
+                return None
+        return defaults
+
+    async def _copy(
+        self,
+        attributes_list: list[dict[str, Any]],
+        keys: list[str],
+        defaults: dict[str, Callable[[], Any]],
+        *,
+        into: Optional[str] = None,
+    ) -> None:
+        """
+        Load rows with `COPY`, into the model's table or into the temporary table `into`.
+
+        The columns are loaded in the order given by `_copy_keys`.
+        """
+        table = self.model_class.__table__
+        columns = inspect(self.model_class).columns
+        plain = [key for key in keys if key not in defaults]
+        defaulted = list(defaults.items())
+
+        def record(attributes: dict[str, Any]) -> tuple:
+            return (
+                *map(attributes.get, plain),
+                *(attributes[key] if key in attributes else default() for key, default in defaulted),
+            )
+
+        connection = await self._writer_connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        if not driver_connection.is_in_transaction():
+            # The asyncpg adapter only sends BEGIN before the first statement it executes itself, and COPY goes to
+            # the driver connection directly: begin the session's transaction through the adapter, so that the COPY
+            # is committed or rolled back with it rather than autocommitted.
+            await raw_connection.dbapi_connection._start_transaction()
+        await driver_connection.copy_records_to_table(
+            into or table.name,
+            records=map(record, attributes_list),
+            columns=[columns[key].name for key in self._copy_keys(keys, defaults)],
+            schema_name=None if into else table.schema,
+        )
+
+    @staticmethod
+    def _copy_keys(keys: list[str], defaults: dict[str, Callable[[], Any]]) -> list[str]:
+        return [*(key for key in keys if key not in defaults), *defaults]
+
+    async def _writer_connection(self) -> AsyncConnection:
+        """The session's connection to the writer, inside its transaction."""
+        return await self.session.connection(bind_arguments={"clause": insert(self.model_class)})
 
     @safeguard_db_ops()
     async def update(self, where_: list[Any], attributes: Dict[str, Any], commit=False) -> ModelType:
@@ -350,6 +570,81 @@ class BaseRepository(Generic[ModelType]):
 
         return result.scalars().first()
 
+    @safeguard_db_ops()
+    async def update_many(
+        self,
+        attributes_list: list[dict[str, Any]],
+        key: str | Sequence[str] = "id",
+        commit=False,
+        *,
+        returning: bool = False,
+        chunk_size: Optional[int] = None,
+    ) -> Sequence[ModelType] | int:
+        """Updates many records, each with its own values, in one statement per chunk.
+
+        The values are bound as one array per column and joined to the table on `key`:
+        `UPDATE table SET ... FROM unnest(:key, :col, ...) AS v(key, col, ...) WHERE table.key = v.key`.
+        The statement does not grow with the number of rows, so it is compiled once and cached, and
+        it is not bound by the bind parameter limit. Each row only updates the attributes it provides.
+
+        Args:
+            attributes_list (list[dict[str, Any]]): A list of dictionaries, each holding the `key`
+                attributes of a record and the attributes to update.
+            key (str | Sequence[str]): The attribute(s) identifying the records. Defaults to `"id"`.
+            commit (bool): Whether to commit the changes to the database. Defaults to False.
+            returning (bool): Whether to return the updated instances. Defaults to False.
+            chunk_size (Optional[int]): The number of rows per statement. Defaults to `UPDATE_CHUNK_SIZE`.
+
+        Returns:
+            Sequence[ModelType] | int: A list of the updated model instances, or the number of rows
+                updated when `returning` is False.
+
+        Raises:
+            SystemException: If a `key` attribute is not a mapped column, or a row does not provide it.
+
+        Example:
+            ```python
+            await self.update_many([{"id": user.id, "age": user.age + 1} for user in users])
+            ```
+        """
+        keys = [key] if isinstance(key, str) else list(key)
+        columns = inspect(self.model_class).columns
+        unmapped = [k for k in keys if k not in columns]
+        if unmapped:
+            raise SystemException(f"{', '.join(unmapped)} not a mapped column of {self.model_class.__name__}")
+        if any(k not in attributes for attributes in attributes_list for k in keys):
+            raise SystemException(f"Every row must provide {', '.join(keys)}")
+
+        result = [] if returning else 0
+        for shape in self._group_by_keys(attributes_list):
+            names = [*keys, *(name for name in shape[0] if name not in keys and name in columns)]
+            if len(names) == len(keys):
+                continue
+            rows = (
+                func.unnest(*(bindparam(f"v_{name}", type_=ARRAY(columns[name].type)) for name in names))
+                .table_valued(*(column(name, columns[name].type) for name in names))
+                .render_derived(name="v")
+            )
+            stmt = (
+                update(self.model_class)
+                .where(and_(*(getattr(self.model_class, k) == rows.c[k] for k in keys)))
+                .values({name: rows.c[name] for name in names if name not in keys})
+                .execution_options(synchronize_session=False)
+            )
+            if returning:
+                stmt = stmt.returning(self.model_class).execution_options(populate_existing=True)
+            for chunk in ut.chunked(shape, chunk_size or self.UPDATE_CHUNK_SIZE):
+                params = {f"v_{name}": [attributes[name] for attributes in chunk] for name in names}
+                response = await self.session.execute(stmt, params)
+                if returning:
+                    result.extend(response.scalars().all())
+                else:
+                    result += response.rowcount
+
+        if commit:
+            await self.session.commit()
+        return result
+
     @safeguard_db_ops()
     async def upsert(
         self,
@@ -402,12 +697,24 @@ class BaseRepository(Generic[ModelType]):
 
     @safeguard_db_ops()
     async def upsert_many(
-        self, index_elements: list[Any], attributes_list: list[dict[str, Any]], commit=False
-    ) -> Sequence[ModelType]:
+        self,
+        index_elements: list[Any],
+        attributes_list: list[dict[str, Any]],
+        commit=False,
+        *,
+        returning: bool = True,
+        chunk_size: Optional[int] = None,
+        staging: Optional[bool] = None,
+    ) -> Sequence[ModelType] | UpsertResult:
         """Upserts multiple model instances in the database.
 
         For each entry in the `attributes_list`, the function will either insert a new record or update
-        an existing record based on conflicts with the `index_elements`.
+        an existing record based on conflicts with the `index_elements`. Only the attributes present in
+        an entry are updated, and when several entries share the same index values, the last one wins.
+
+        Rows are sent in chunks that stay under the bind parameter limit. Without `returning`, large
+        batches are loaded with `COPY` into a temporary staging table instead, and merged with a single
+        `INSERT ... SELECT ... ON CONFLICT`.
 
         Args:
             index_elements (list[Any]): A list of index elements (columns) used to identify conflicts for
@@ -415,33 +722,132 @@ class BaseRepository(Generic[ModelType]):
             attributes_list (list[dict[str, Any]]): A list of dictionaries, where each dictionary contains
                 the attributes for a model instance to be upserted.
             commit (bool): Whether to commit the changes to the database. Defaults to False.
+            returning (bool): Whether to return the upserted instances. Defaults to True.
+            chunk_size (Optional[int]): The number of rows per statement. Defaults to as many as the
+                bind parameter limit allows.
+            staging (Optional[bool]): Whether to merge through a staging table when `returning` is False.
+                Defaults to batches of at least `STAGING_THRESHOLD` rows. Only available with asyncpg,
+                for entries that all have the same attributes.
 
         Returns:
-            Sequence[ModelType]: A list of upserted model instances.
+            Sequence[ModelType] | UpsertResult: A list of upserted model instances, or the number of rows
+                inserted and updated, in total and per statement, when `returning` is False.
         """
-        mapper = inspect(self.model_class)
-        columns = mapper.columns.keys()
-        valid_attributes_list = [
-            {key: value for key, value in attributes.items() if key in columns} for attributes in attributes_list
-        ]
-
-        if "updated_at" in columns:
-            valid_attributes_list = [{**attributes, "updated_at": func.now()} for attributes in valid_attributes_list]
-
-        stmt = (
-            insert(self.model_class)
-            .values(valid_attributes_list)
-            .on_conflict_do_update(
-                index_elements=index_elements,
-                set_={col: getattr(insert(self.model_class).excluded, col) for col in valid_attributes_list[0]},
-            )
-            .returning(self.model_class)
+        columns = inspect(self.model_class).columns.keys()
+        index_keys = [getattr(element, "key", element) for element in index_elements]
+        rows = self._dedupe(
+            [{key: value for key, value in attributes.items() if key in columns} for attributes in attributes_list],
+            index_keys,
         )
-        result = await self.session.execute(stmt)
+        if not rows:
+            return [] if returning else UpsertResult()
+
+        keys = self._keys_of(rows)
+        if staging is None:
+            staging = len(rows) >= self.STAGING_THRESHOLD
+        if not returning and staging and self._supports_copy() and all(len(row) == len(keys) for row in rows):
+            defaults = self._copy_defaults(rows, keys)
+            if defaults is not None:
+                result = await self._upsert_staged(index_keys, rows, keys, defaults)
+                if commit:
+                    await self.session.commit()
+                return result
+
+        result = [] if returning else UpsertResult()
+        for shape in self._group_by_keys(rows):
+            for chunk in ut.chunked(shape, chunk_size or self._chunk_size()):
+                stmt = insert(self.model_class).values(list(chunk))
+                set_ = self._upsert_set(stmt.excluded, chunk[0].keys(), index_keys, columns)
+                if set_:
+                    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+                if returning:
+                    result.extend((await self.session.execute(stmt.returning(self.model_class))).scalars().all())
+                else:
+                    # xmax is 0 for freshly inserted tuples and set for updated ones.
+                    result.add((await self.session.execute(stmt.returning(literal_column("xmax = 0")))).scalars())
 
         if commit:
             await self.session.commit()
-        return result.scalars().all()
+        return result
+
+    async def _upsert_staged(
+        self,
+        index_keys: list[str],
+        rows: list[dict[str, Any]],
+        keys: list[str],
+        defaults: dict[str, Callable[[], Any]],
+    ) -> UpsertResult:
+        connection = await self._writer_connection()
+        preparer = connection.dialect.identifier_preparer
+        table = self.model_class.__table__
+        columns = inspect(self.model_class).columns
+
+        def quote(key: str) -> str:
+            return preparer.quote(columns[key].name)
+
+        stage_name = f"_upsert_{table.name}_{uuid4().hex[:8]}"
+        stage = preparer.quote(stage_name)
+        copy_keys = self._copy_keys(keys, defaults)
+        names = ", ".join(quote(key) for key in copy_keys)
+        # Only the attributes the rows provide are updated: the defaults filled in for the COPY (e.g. a new
+        # primary key) are meant for inserted rows, not for the existing ones.
+        updates = [
+            f"{quote(key)} = EXCLUDED.{quote(key)}" for key in keys if key not in index_keys and key != "updated_at"
+        ]
+        if "updated_at" in columns.keys():
+            updates.append(f"{quote('updated_at')} = now()")
+        conflict = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+
+        # Temporary tables are not WAL-logged; the staging table only lives as long as the transaction.
+        await connection.execute(
+            text(
+                f"CREATE TEMPORARY TABLE {stage} ON COMMIT DROP AS "
+                f"SELECT {names} FROM {preparer.format_table(table)} WITH NO DATA"
+            )
+        )
+        await self._copy(rows, keys, defaults, into=stage_name)
+        counts = await connection.execute(
+            text(
+                f"WITH upserted AS ("
+                f"INSERT INTO {preparer.format_table(table)} ({names}) SELECT {names} FROM {stage} "
+                f"ON CONFLICT ({', '.join(quote(key) for key in index_keys)}) {conflict} "
+                f"RETURNING (xmax = 0) AS inserted"
+                f") SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted"
+            )
+        )
+        result = UpsertResult()
+        result.add_batch(*counts.one())
+        await connection.execute(text(f"DROP TABLE {stage}"))
+        return result
+
+    @staticmethod
+    def _dedupe(rows: list[dict[str, Any]], index_keys: list[str]) -> list[dict[str, Any]]:
+        """Keep the last of the rows sharing the same index values; a single statement cannot update a row twice."""
+        keyed: dict[tuple, dict[str, Any]] = {}
+        unkeyed = []
+        for row in rows:
+            if all(key in row for key in index_keys):
+                keyed[tuple(row[key] for key in index_keys)] = row
+            else:
+                unkeyed.append(row)
+        return [*keyed.values(), *unkeyed]
+
+    @staticmethod
+    def _group_by_keys(rows: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+        """Group the rows by the set of attributes they provide, so each statement updates only those."""
+        groups: dict[frozenset, list[dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(frozenset(row), []).append(row)
+        return list(groups.values())
+
+    @staticmethod
+    def _upsert_set(excluded: Any, keys: Iterable[str], index_keys: list[str], columns: list[str]) -> dict[str, Any]:
+        set_ = {key: excluded[key] for key in keys if key not in index_keys and key != "updated_at"}
+        if "updated_at" in columns:
+            set_["updated_at"] = func.now()
+        return set_
 
     @safeguard_db_ops()
     async def get_many(
@@ -454,10 +860,13 @@ class BaseRepository(Generic[ModelType]):
         order_: Optional[dict] = None,
         where_: Optional[list] = None,
         group_by_: Optional[list] = None,
-    ) -> Sequence[ModelType]:
+        as_: Optional[Callable[..., T]] = None,
+    ) -> Sequence[ModelType] | Sequence[Row] | list[T]:
         """Retrieves a list of records based on various query parameters.
 
-        Supports pagination, filtering, ordering, joining, and grouping of records.
+        Supports pagination, filtering, ordering, joining, and grouping of records. With `fields`, the
+        selected columns are returned as rows, or built into `as_` (e.g. a slotted dataclass) from the
+        column names, without going through the identity map.
 
         Args:
             skip (Optional[int]): The number of records to skip. Used for pagination.
@@ -468,9 +877,11 @@ class BaseRepository(Generic[ModelType]):
             order_ (Optional[dict]): A dictionary specifying the fields and their order (ASC/DESC).
             where_ (Optional[list]): A list of conditions to filter the records.
             group_by_ (Optional[list]): A list of fields to group the results by.
+            as_ (Optional[Callable[..., T]]): A type built from each row's columns, used with `fields`.
 
         Returns:
-            Sequence[ModelType]: A list of model instances that match the query parameters.
+            Sequence[ModelType] | Sequence[Row] | list[T]: The model instances, rows or projections that match
+            the query parameters.
         """
 
         query = await self._query(
@@ -483,9 +894,219 @@ class BaseRepository(Generic[ModelType]):
             where_=where_,
             group_by_=group_by_,
         )
+        if fields:
+            rows = (await self.session.execute(query)).all()
+            return _project(rows, as_) if as_ is not None else rows
         result = await self.session.scalars(query)
         return result.all()
 
+    @safeguard_db_ops()
+    async def get_page(
+        self,
+        skip: int = 0,
+        limit: int = 50,
+        *,
+        join_: Optional[set[str]] = None,
+        order_: Optional[dict] = None,
+        where_: Optional[list] = None,
+        count: Literal["exact", "estimated"] = "exact",
+    ) -> Page[ModelType]:
+        """Retrieves a page of records along with the total number of matching records.
+
+        With an exact count, the total comes from `count(*) OVER ()` in the same statement as the
+        page, so a listing costs one round trip. A separate count only runs when the page is empty
+        past the first one. With an estimated count, the total is read from the planner statistics
+        instead: `pg_class.reltuples` for unfiltered queries, the `EXPLAIN` row estimate otherwise.
+        Estimates are cheap on huge tables but only as accurate as the last `ANALYZE`.
+
+        Args:
+            skip (int): The number of records to skip.
+            limit (int): The maximum number of records to return.
+            join_ (Optional[set[str]]): A set of related tables to join with the query.
+            order_ (Optional[dict]): A dictionary specifying the fields and their order (ASC/DESC).
+            where_ (Optional[list]): A list of conditions to filter the records.
+            count (Literal["exact", "estimated"]): How to compute the total. Defaults to `"exact"`.
+
+        Returns:
+            Page[ModelType]: The records of the page and the total number of matching records.
+
+        Example:
+            ```python
+            page = await self.get_page(skip=100, limit=50, order_={"desc": ["created_at"]})
+            print(page.total, page.has_next)
+            ```
+        """
+        base = await self._query(join_=join_, where_=where_)
+        query = await self._query(skip=skip, limit=limit, join_=join_, order_=order_, where_=where_)
+
+        if count == "estimated":
+            items = (await self.session.scalars(query)).all()
+            total = await self._estimate_count(base, unfiltered=not where_ and not join_)
+            # The estimate can lag behind; it is at least the number of records seen so far.
+            return Page(items=items, total=max(total, skip + len(items)), skip=skip, limit=limit, estimated=True)
+
+        rows = (await self.session.execute(query.add_columns(func.count().over().label("total")))).all()
+        items = [row[0] for row in rows]
+        if rows:
+            total = rows[0].total
+        else:
+            total = await self._count(base) if skip else 0
+        return Page(items=items, total=total, skip=skip, limit=limit)
+
+    async def _estimate_count(self, query: Select, unfiltered: bool) -> int:
+        """
+        The planner's estimate of the number of rows of `query`: the table statistics when `unfiltered`,
+        the row estimate of its plan otherwise. Falls back to an exact count for never-analyzed tables.
+        """
+        if unfiltered:
+            table = self.model_class.__table__
+            estimate = await self.session.scalar(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": f"{table.schema}.{table.name}" if table.schema else table.name},
+            )
+            if estimate is not None and estimate >= 0:
+                return estimate
+            return await self._count(query)
+
+        connection = await self.session.connection()
+        plan = await connection.scalar(Explain(query))
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    @safeguard_db_ops()
+    async def stream_many(
+        self,
+        *,
+        batch_size: int = 1000,
+        skip: Optional[int] = None,
+        limit: Optional[int] = None,
+        fields: Optional[list] = None,
+        distinct_: Optional[list] = None,
+        join_: Optional[set[str]] = None,
+        order_: Optional[dict] = None,
+        where_: Optional[list] = None,
+    ) -> AsyncIterator[ModelType]:
+        """Yields the records matching the query parameters, fetching them in batches.
+
+        Rows are read through a server-side cursor, `batch_size` at a time, so memory use does not
+        depend on the size of the result. The session stays busy until the iteration ends.
+
+        Args:
+            batch_size (int): The number of rows fetched from the database at a time.
+            skip (Optional[int]): The number of records to skip.
+            limit (Optional[int]): The maximum number of records to return.
+            fields (Optional[list]): Specific fields to retrieve. Rows are yielded instead of model instances.
+            distinct_ (Optional[list]): A list of fields to apply distinct filtering on.
+            join_ (Optional[set[str]]): A set of related tables to join with the query.
+            order_ (Optional[dict]): A dictionary specifying the fields and their order (ASC/DESC).
+            where_ (Optional[list]): A list of conditions to filter the records.
+
+        Yields:
+            ModelType: The model instances (or rows, with `fields`) that match the query parameters.
+
+        Example:
+            ```python
+            async for user in self.stream_many(batch_size=500, where_=[User.age > 18]):
+                ...
+            ```
+        """
+        query = await self._query(
+            skip=skip,
+            limit=limit,
+            fields=fields,
+            distinct_=distinct_,
+            join_=join_,
+            order_=order_,
+            where_=where_,
+        )
+        query = query.execution_options(yield_per=batch_size)
+        result = await (self.session.stream(query) if fields else self.session.stream_scalars(query))
+        try:
+            async for partition in result.partitions():
+                for item in partition:
+                    yield item
+        finally:
+            await result.close()
+
+    @safeguard_db_ops()
+    async def paginate(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        *,
+        order_by: str = "id",
+        desc: bool = False,
+        join_: Optional[set[str]] = None,
+        where_: Optional[list] = None,
+    ) -> CursorPage[ModelType]:
+        """Retrieves a page of records using keyset (cursor) pagination.
+
+        Instead of skipping rows with `OFFSET`, each page continues from the `(order_by, primary key)`
+        values of the last row of the previous one, so every page costs the same index lookup however
+        deep it is. The primary key breaks ties between rows sharing the same `order_by` value. Use a
+        non-nullable `order_by` column, ideally covered by an index on `(order_by, primary key)`.
+
+        Args:
+            limit (int): The maximum number of records to return.
+            cursor (Optional[str]): A `next_cursor` or `prev_cursor` of a previous page. Returns the first
+                page when not provided.
+            order_by (str): The name of the attribute to order by. Defaults to the primary key.
+            desc (bool): Whether to order in descending order. Defaults to False.
+            join_ (Optional[set[str]]): A set of related tables to join with the query.
+            where_ (Optional[list]): A list of conditions to filter the records.
+
+        Returns:
+            CursorPage[ModelType]: The records of the page and the cursors of the next and previous pages.
+
+        Raises:
+            BadRequestException: If the cursor is malformed or was built for another `order_by`.
+
+        Example:
+            ```python
+            page = await self.paginate(limit=50, order_by="created_at", desc=True)
+            next_page = await self.paginate(limit=50, cursor=page.next_cursor, order_by="created_at", desc=True)
+            ```
+        """
+        mapper = inspect(self.model_class)
+        pk_name = mapper.get_property_by_column(mapper.primary_key[0]).key
+        names = (order_by,) if order_by == pk_name else (order_by, pk_name)
+        attributes = [getattr(self.model_class, name) for name in names]
+
+        forward = True
+        query = await self._query(limit=limit + 1, join_=join_, where_=where_)
+        if cursor is not None:
+            position = Cursor.decode(cursor, order_by, [self._python_type(mapper, name) for name in names])
+            forward = position.forward
+            key = tuple_(*attributes) if len(attributes) > 1 else attributes[0]
+            value = position.values if len(attributes) > 1 else position.values[0]
+            # Rows after the cursor in the requested order, or before it when paging backward.
+            query = query.where(key > value if forward != desc else key < value)
+
+        descending = desc if forward else not desc
+        query = query.order_by(*(attribute.desc() if descending else attribute.asc() for attribute in attributes))
+
+        items = list((await self.session.scalars(query)).all())
+        has_more = len(items) > limit
+        items = items[:limit]
+        if not forward:
+            items.reverse()
+
+        def cursor_of(item: ModelType, forward_: bool) -> str:
+            return Cursor(order_by, tuple(getattr(item, name) for name in names), forward_).encode()
+
+        page = CursorPage(items=items)
+        if items and (has_more if forward else True):
+            page.next_cursor = cursor_of(items[-1], True)
+        if items and (cursor is not None if forward else has_more):
+            page.prev_cursor = cursor_of(items[0], False)
+        return page
+
+    @staticmethod
+    def _python_type(mapper: Any, name: str) -> Optional[type]:
+        try:
+            return mapper.columns[name].type.python_type
+        except NotImplementedError:
+            return None
+
     @safeguard_db_ops()
     async def first(
         self,
@@ -495,9 +1116,13 @@ class BaseRepository(Generic[ModelType]):
         join_: Optional[set[str]] = None,
         order_: Optional[dict] = None,
         relations: Optional[list[str]] = None,
-    ) -> ModelType | None:
+        as_: Optional[Callable[..., T]] = None,
+    ) -> ModelType | Row | T | None:
         """Retrieves the first model instance that matches the specified query parameters.
 
+        The query is limited to a single row. With `fields`, only those columns are selected and the row is
+        returned as is, or built into `as_`, instead of a model instance.
+
         Args:
             fields (Optional[list]): A list of specific fields to retrieve from the model.
             where_ (Optional[list]): A list of conditions to filter the records.
@@ -505,11 +1130,24 @@ class BaseRepository(Generic[ModelType]):
             join_ (Optional[set[str]]): A set of related tables to join with the query.
             order_ (Optional[dict]): A dictionary specifying the fields and their order (ASC/DESC).
             relations (Optional[list[str]]): A list of relationships to eagerly load with the query.
+            as_ (Optional[Callable[..., T]]): A type built from the row's columns, used with `fields`.
 
         Returns:
-            ModelType | None: The first model instance that matches the query parameters, or None if no match is found.
+            ModelType | Row | T | None: The first model instance, row or projection that matches the query
+            parameters, or None if no match is found.
+
+        Example:
+            ```python
+            user = await self.first(fields=[User.id], where_=[User.email_address == email])
+            user.id
+            ```
         """
-        query = await self._query(skip=skip, join_=join_, fields=fields, order_=order_, where_=where_)
+        query = await self._query(skip=skip, limit=1, join_=join_, fields=fields, order_=order_, where_=where_)
+        if fields:
+            row = (await self.session.execute(query)).first()
+            if row is None or as_ is None:
+                return row
+            return as_(**row._mapping)
         if relations:
             for relation in relations:
                 query = query.options(selectinload(relation))
@@ -520,20 +1158,22 @@ class BaseRepository(Generic[ModelType]):
     async def exists(
         self,
         where_: Optional[list] = None,
+        join_: Optional[set[str]] = None,
     ) -> bool:
         """Checks whether a model instance matching the given conditions exists.
 
+        Runs `SELECT EXISTS (SELECT 1 ...)`, so the database stops at the first match and no row is loaded.
+
         Args:
             where_ (Optional[list]): A list of conditions used to filter the records.
+            join_ (Optional[set[str]]): A set of related tables to join with the query.
 
         Returns:
             bool: True if a model instance exists that matches the given conditions, False otherwise.
         """
-        query = select(self.model_class)
-        if where_:
-            query = await self._query(where_=where_)
-        result = await self.session.scalars(query)
-        return bool(result.first())
+        query = select(literal_column("1")).select_from(self.model_class).where(*(where_ or ()))
+        query = self._maybe_join(query, join_)
+        return bool(await self.session.scalar(select(query.exists())))
 
     @safeguard_db_ops()
     async def delete(
@@ -541,22 +1181,99 @@ class BaseRepository(Generic[ModelType]):
         where_: Optional[list] = None,
         *,
         synchronize_session: SynchronizeSessionEnum = SynchronizeSessionEnum.FALSE,
-    ):
+        returning: bool = True,
+        commit=False,
+    ) -> Sequence[ModelType] | int:
         """Deletes model instances that match the given conditions.
 
+        The deleted rows are read back from `DELETE ... RETURNING` in the same statement.
+
         Args:
             where_ (Optional[list]): A list of conditions used to filter which model instances to delete.
             synchronize_session (SynchronizeSessionEnum): Defines how the session synchronization should be handled.
                 Defaults to `SynchronizeSessionEnum.FALSE`.
+            returning (bool): Whether to return the deleted instances. Defaults to True.
+            commit (bool): Whether to commit the changes to the database. Defaults to False.
 
         Returns:
-            Sequence[ModelType]: A list of the deleted model instances.
+            Sequence[ModelType] | int: A list of the deleted model instances, or the number of rows
+                deleted when `returning` is False.
         """
-        del_instances = await self.get_many(where_=where_)
         query = delete(self.model_class)
         if where_ is not None:
             for condition in where_:
                 query = query.where(condition)
         query = query.execution_options(synchronize_session=synchronize_session.value)
-        await self.session.execute(query)
-        return del_instances
+        if returning:
+            result = (await self.session.execute(query.returning(self.model_class))).scalars().all()
+        else:
+            result = (await self.session.execute(query)).rowcount
+
+        if commit:
+            await self.session.commit()
+        return result
+
+    @safeguard_db_ops()
+    async def delete_in_batches(
+        self,
+        where_: Optional[list] = None,
+        *,
+        batch_size: int = 1000,
+        pause: float = 0,
+        commit=True,
+        retries: int = 5,
+        retry_delay: float = 0.5,
+    ) -> int:
+        """Deletes the matching rows a batch at a time, until none is left.
+
+        Each batch is `DELETE ... WHERE pk IN (SELECT pk ... LIMIT batch_size FOR UPDATE SKIP LOCKED)`.
+        With `commit`, every batch is its own transaction, so locks are held briefly and WAL is
+        written (and replicated) in small increments rather than in one burst. Rows locked by other
+        transactions are skipped, and deleted by a later batch once released: while only locked rows
+        remain, batches are retried up to `retries` times, waiting `retry_delay` seconds, doubled after
+        each attempt, in between.
+
+        Args:
+            where_ (Optional[list]): A list of conditions used to filter which rows to delete.
+            batch_size (int): The maximum number of rows deleted per statement.
+            pause (float): Seconds to wait between batches, e.g. to let replicas catch up.
+            commit (bool): Whether to commit after each batch. Defaults to True.
+            retries (int): How many times to wait for locked rows before giving up on them.
+            retry_delay (float): Seconds to wait before the first retry.
+
+        Returns:
+            int: The number of rows deleted.
+
+        Raises:
+            SystemException: If `batch_size` is not positive.
+        """
+        if batch_size <= 0:
+            raise SystemException("batch_size must be positive")
+
+        pk = inspect(self.model_class).primary_key[0]
+        batch = select(pk).limit(batch_size).with_for_update(skip_locked=True).correlate(None)
+        for condition in where_ or []:
+            batch = batch.where(condition)
+        query = delete(self.model_class).where(pk.in_(batch.scalar_subquery()))
+        query = query.execution_options(synchronize_session=False)
+
+        total = 0
+        attempts = 0
+        while True:
+            deleted = (await self.session.execute(query)).rowcount
+            total += deleted
+            if commit:
+                await self.session.commit()
+            if deleted:
+                attempts = 0
+            # A short batch means that the remaining rows, if any, are locked by other transactions.
+            if deleted < batch_size and not await self.exists(where_=where_):
+                return total
+            if not deleted:
+                if attempts >= retries:
+                    syslog.warning(f"Gave up deleting {self.model_class.__name__} rows locked by other transactions")
+                    return total
+                await asyncio.sleep(retry_delay * 2**attempts)
+                attempts += 1
+            elif pause:
+                await asyncio.sleep(pause)
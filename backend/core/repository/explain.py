@@ -0,0 +1,20 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+
+class Explain(Executable, ClauseElement):
+    """
+    `EXPLAIN (FORMAT JSON)` of a statement, executed like the statement itself so that its parameters,
+    including expanding ones such as `IN` lists, are bound the same way.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: ClauseElement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
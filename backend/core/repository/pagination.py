@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Generic, Optional, Sequence, TypeVar
+from uuid import UUID
+
+from core.exceptions import BadRequestException
+
+T = TypeVar("T")
+
+_ISO_TYPES = (datetime, date, time)
+
+
+@dataclass(slots=True)
+class CursorPage(Generic[T]):
+    """
+    A page of results and the opaque cursors of its neighbours, `None` when there is no such page.
+    """
+
+    items: Sequence[T] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Page(Generic[T]):
+    """
+    A page of results with the total number of matching records, which may be an estimate.
+    """
+
+    items: Sequence[T] = field(default_factory=list)
+    total: int = 0
+    skip: int = 0
+    limit: Optional[int] = None
+    estimated: bool = False
+
+    @property
+    def has_next(self) -> bool:
+        return self.skip + len(self.items) < self.total
+
+
+@dataclass(slots=True)
+class Cursor:
+    """
+    A position in a keyset ordering: the order column and primary key values of a boundary row, and
+    whether the page requested is the one after (`forward`) or before that row.
+    """
+
+    order_by: str
+    values: tuple
+    forward: bool = True
+
+    def encode(self) -> str:
+        payload = {"o": self.order_by, "v": [_dump(value) for value in self.values], "f": self.forward}
+        data = json.dumps(payload, separators=(",", ":")).encode("utf8")
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode(cls, cursor: str, order_by: str, python_types: Sequence[Optional[type]]) -> "Cursor":
+        """
+        Parse a cursor built for `order_by` and convert its values back to the column `python_types`.
+
+        Raises:
+            BadRequestException: If the cursor is malformed or was built for another ordering.
+        """
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            payload = json.loads(data)
+            values = payload["v"]
+            if payload["o"] != order_by or len(values) != len(python_types):
+                raise ValueError
+            values = tuple(_load(value, python_type) for value, python_type in zip(values, python_types))
+            return cls(order_by=order_by, values=values, forward=bool(payload["f"]))
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+            raise BadRequestException("Invalid pagination cursor")
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, _ISO_TYPES):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def _load(value: Any, python_type: Optional[type]) -> Any:
+    if value is None or python_type is None or isinstance(value, python_type):
+        return value
+    if issubclass(python_type, _ISO_TYPES):
+        return python_type.fromisoformat(value)
+    return python_type(value)
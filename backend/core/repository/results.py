@@ -0,0 +1,28 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+
+@dataclass(slots=True)
+class UpsertResult:
+    """
+    The number of rows inserted and updated by a bulk upsert, in total and per statement (`batches`, as
+    `(inserted, updated)` pairs).
+    """
+
+    inserted: int = 0
+    updated: int = 0
+    batches: list[tuple[int, int]] = field(default_factory=list)
+
+    def add(self, inserted_flags: Iterable[bool]) -> None:
+        flags = list(inserted_flags)
+        inserted = sum(flags)
+        self.add_batch(inserted, len(flags) - inserted)
+
+    def add_batch(self, inserted: int, updated: int) -> None:
+        self.inserted += inserted
+        self.updated += updated
+        self.batches.append((inserted, updated))
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated
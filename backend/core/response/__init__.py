@@ -1,6 +1,9 @@
 from .api_response import Error, Ok
+from .streaming import csv_stream, ndjson_stream
 
 __all__ = [
     "Error",
     "Ok",
+    "csv_stream",
+    "ndjson_stream",
 ]
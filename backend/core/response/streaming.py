@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, AsyncIterable, AsyncIterator, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Row
+
+import core.utils as ut
+from core.db import Base
+
+# Output is buffered and sent in chunks of about this size rather than one write per record.
+CHUNK_SIZE = 64 * 1024
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if ut.has("orjson"):
+    import orjson
+
+    def _json_line(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+
+else:
+
+    def _json_line(value: Any) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":")).encode("utf8") + b"\n"
+
+
+def _as_dict(item: Any, exclude: Optional[list[str]] = None) -> dict[str, Any]:
+    if isinstance(item, Base):
+        return item.to_dict(exclude=list(exclude or []))
+    if isinstance(item, Row):
+        return item._asdict()
+    return dict(item)
+
+
+async def ndjson_stream(items: AsyncIterable[Any], *, exclude: Optional[list[str]] = None) -> AsyncIterator[bytes]:
+    """
+    Serialize models, rows or dicts as newline-delimited JSON, for a `StreamingResponse`.
+
+    Usage:
+        return StreamingResponse(ndjson_stream(controller.stream_many()), media_type="application/x-ndjson")
+    """
+    buffer = bytearray()
+    async for item in items:
+        buffer += _json_line(_as_dict(item, exclude))
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def csv_stream(
+    items: AsyncIterable[Any],
+    *,
+    columns: Optional[Sequence[str]] = None,
+    exclude: Optional[list[str]] = None,
+) -> AsyncIterator[str]:
+    """
+    Serialize models, rows or dicts as CSV with a header line, for a `StreamingResponse`.
+
+    The columns default to the keys of the first item; keys missing from an item are left empty.
+    """
+    buffer = io.StringIO()
+    writer = None
+    async for item in items:
+        record = _as_dict(item, exclude)
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(columns or record), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow({key: _csv_value(value) for key, value in record.items()})
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if writer is None and columns:
+        csv.writer(buffer).writerow(columns)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    try:
+        return _default(value)
+    except TypeError:
+        return str(value)
@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, Iterator, List, Sequence
 
 
 def nth(arr: List[Any], n: int, default: Any = None) -> any:
@@ -9,3 +9,11 @@ def nth(arr: List[Any], n: int, default: Any = None) -> any:
         return arr[n]
     except IndexError:
         return default
+
+
+def chunked(arr: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    """
+    Split an array into consecutive slices of at most `size` elements.
+    """
+    for start in range(0, len(arr), size):
+        yield arr[start : start + size]
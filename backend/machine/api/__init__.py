@@ -5,12 +5,14 @@ from fastapi import APIRouter, Request
 from fastapi.templating import Jinja2Templates
 
 import core.utils as ut
+from machine.api.metrics import router as metrics_router
 from machine.api.ping import router as ping_router
 from machine.api.v1 import router as router_v1
 from machine.api.v2 import router as router_v2
 
 router = APIRouter()
 router.include_router(ping_router)
+router.include_router(metrics_router)
 router.include_router(router_v1)
 router.include_router(router_v2)
 templates = Jinja2Templates(directory="templates")
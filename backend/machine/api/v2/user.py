@@ -1,7 +1,9 @@
-from typing import List
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 
+from core.response import csv_stream, ndjson_stream
 from machine.controllers import UserController
 from machine.models import User
 from machine.providers import InternalProvider
@@ -21,10 +23,37 @@ async def create(
 
 @router.get("/", response_model=List[UserResponse])
 async def list(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
     user_controller: UserController = Depends(InternalProvider().get_user_controller),
 ):
-    users = await user_controller.get_many()
-    return users
+    if limit is None and cursor is None:
+        return await user_controller.get_many()
+
+    # Newest first, paginated by cursor; the cursors of the neighbouring pages are returned in headers.
+    page = await user_controller.paginate(limit=limit or 50, cursor=cursor, order_by="created_at", desc=True)
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.prev_cursor:
+        response.headers["X-Prev-Cursor"] = page.prev_cursor
+    return page.items
+
+
+@router.get("/export")
+async def export(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    user_controller: UserController = Depends(InternalProvider().get_user_controller),
+):
+    # Rows are fetched through a server-side cursor and serialized as they arrive.
+    users = user_controller.stream_many(order_={"asc": ["created_at"]})
+    if format == "csv":
+        return StreamingResponse(
+            csv_stream(users),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="users.csv"'},
+        )
+    return StreamingResponse(ndjson_stream(users), media_type="application/x-ndjson")
 
 
 @router.delete("/{id}")
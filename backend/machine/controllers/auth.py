@@ -39,7 +39,9 @@ class AuthController:
         user_info = await self.google_oauth_client.fetch_user_info(access_token)
 
         # Step 3: Check if the user already exists in the database by their email address
-        existing_user = await self.user_repository.first(where_=[User.email_address == user_info["email"]])
+        existing_user = await self.user_repository.first(
+            fields=[User.id], where_=[User.email_address == user_info["email"]]
+        )
         if not existing_user:
             new_user_data = {
                 "email_address": user_info["email"]
@@ -1,14 +1,99 @@
-from typing import Optional
+from typing import Any, Iterable, Optional, Sequence
 from uuid import UUID
+
+from core.cache import Cache
 from core.controller import BaseController
+from core.db import Transactional
+from core.repository import UpsertResult
+from core.repository.enum import SynchronizeSessionEnum
 from machine.models import User
 from machine.repositories import UserRepository
 
 
 class UserController(BaseController[User]):
+    """
+    Cached user lookups. Every write invalidates the cache entries of the users it touched once committed, or of
+    all users when a bulk write does not tell which ones (the `user` tag).
+    """
+
     def __init__(self, user_repository: UserRepository):
         super().__init__(model_class=User, repository=user_repository)
         self.user_repository = user_repository
 
+    # Unknown ids are cached too (negative caching), so repeated lookups do not reach the database.
+    @Cache.cached(prefix="user", ttl=60, tags=["user", "user:{user_id}"])
     async def get(self, user_id: UUID) -> Optional[User]:
         return await self.user_repository.first(where_=[User.id == user_id])
+
+    async def create(self, attributes: dict[str, Any]) -> User:
+        user = await super().create(attributes)
+        await self._invalidate([user.id])
+        return user
+
+    async def create_many(
+        self, attributes_list: list[dict[str, Any]], *, returning: bool = True
+    ) -> Sequence[User] | int:
+        created = await super().create_many(attributes_list, returning=returning)
+        # Generated ids cannot have been looked up (and cached as unknown) before; only those given can.
+        given = [attributes["id"] for attributes in attributes_list if attributes.get("id") is not None]
+        await self._invalidate([user.id for user in created] if returning else given)
+        return created
+
+    async def update_many(
+        self, attributes_list: list[dict[str, Any]], key: str | Sequence[str] = "id", *, returning: bool = False
+    ) -> Sequence[User] | int:
+        updated = await super().update_many(attributes_list, key, returning=returning)
+        if returning:
+            await self._invalidate([user.id for user in updated])
+        elif key == "id":
+            await self._invalidate([attributes["id"] for attributes in attributes_list])
+        else:
+            await self._invalidate()
+        return updated
+
+    async def upsert(self, index_elements: list[str], attributes: dict[str, Any]) -> Optional[User]:
+        user = await super().upsert(index_elements, attributes)
+        await self._invalidate([user.id] if user is not None else None)
+        return user
+
+    async def upsert_many(
+        self, index_elements: list[str], attributes_list: list[dict[str, Any]], *, returning: bool = True
+    ) -> Sequence[User] | UpsertResult:
+        upserted = await super().upsert_many(index_elements, attributes_list, returning=returning)
+        await self._invalidate([user.id for user in upserted] if returning else None)
+        return upserted
+
+    async def delete(
+        self,
+        where_: Optional[list] = None,
+        *,
+        synchronize_session: SynchronizeSessionEnum = SynchronizeSessionEnum.FALSE,
+        returning: bool = True,
+    ) -> Sequence[User] | int:
+        # The ids of the deleted users are needed to invalidate their cache entries, even without `returning`.
+        if returning:
+            deleted = await super().delete(where_=where_, synchronize_session=synchronize_session)
+            ids = [user.id for user in deleted]
+        else:
+            ids = await self._delete_ids(where_=where_, synchronize_session=synchronize_session)
+            deleted = len(ids)
+        await self._invalidate(ids)
+        return deleted
+
+    async def delete_in_batches(self, where_: Optional[list] = None, *, batch_size: int = 1000) -> int:
+        deleted = await super().delete_in_batches(where_=where_, batch_size=batch_size)
+        await self._invalidate()
+        return deleted
+
+    @Transactional()
+    async def _delete_ids(
+        self, where_: Optional[list], *, synchronize_session: SynchronizeSessionEnum
+    ) -> Sequence[UUID]:
+        return await self.user_repository.delete_ids(where_=where_, synchronize_session=synchronize_session)
+
+    @staticmethod
+    async def _invalidate(ids: Optional[Iterable[UUID]] = None) -> None:
+        # Called once the base controller committed, so that a concurrent read cannot cache the old row again.
+        tags = ["user"] if ids is None else [f"user:{user_id}" for user_id in ids]
+        if tags:
+            await Cache.invalidate_tags(*tags)
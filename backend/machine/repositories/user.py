@@ -1,5 +1,26 @@
-from core.repository import BaseRepository
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import delete
+
+from core.repository import BaseRepository, SynchronizeSessionEnum
+from core.repository.base import safeguard_db_ops
 from machine.models import User
 
 
-class UserRepository(BaseRepository[User]): ...
+class UserRepository(BaseRepository[User]):
+    @safeguard_db_ops()
+    async def delete_ids(
+        self,
+        where_: Optional[list] = None,
+        *,
+        synchronize_session: SynchronizeSessionEnum = SynchronizeSessionEnum.FALSE,
+    ) -> Sequence[UUID]:
+        """Deletes the users that match the given conditions, reading back only their ids.
+
+        Returns:
+            Sequence[UUID]: The ids of the deleted users.
+        """
+        query = delete(User).where(*(where_ or ())).returning(User.id)
+        query = query.execution_options(synchronize_session=synchronize_session.value)
+        return (await self.session.execute(query)).scalars().all()
@@ -8,7 +8,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 import core.utils as ut
-from core.cache import Cache, DefaultKeyMaker, RedisBackend
+from core.cache import (
+    Cache,
+    DefaultKeyMaker,
+    InMemoryBackend,
+    NearCacheBackend,
+    RedisBackend,
+    RedisInvalidationBus,
+)
+from core.db import session_scope
+from core.db.session import DB_MANAGER, ENGINES, Dialect
 from core.exceptions import CustomException
 from core.fastapi.middlewares import SQLAlchemyMiddleware
 from core.logger import syslog
@@ -38,7 +47,35 @@ def init_listeners(app_: FastAPI) -> None:
 
 
 def init_cache() -> None:
-    Cache.configure(backend=RedisBackend(), key_maker=DefaultKeyMaker())
+    if settings.CACHE_BACKEND == "memory":
+        backend = InMemoryBackend(
+            max_entries=settings.CACHE_MEMORY_MAX_ENTRIES,
+            max_bytes=settings.CACHE_MEMORY_MAX_BYTES,
+        )
+    elif settings.CACHE_NEAR_ENABLED:
+        redis_backend = RedisBackend()
+        backend = NearCacheBackend(
+            redis_backend,
+            invalidator=RedisInvalidationBus(redis_backend.redis, channel=settings.CACHE_INVALIDATION_CHANNEL),
+            local_ttl=settings.CACHE_NEAR_TTL,
+            max_entries=settings.CACHE_NEAR_MAX_ENTRIES,
+            max_bytes=settings.CACHE_NEAR_MAX_BYTES,
+        )
+        backend.start()
+    else:
+        backend = RedisBackend()
+    Cache.configure(
+        backend=backend,
+        key_maker=DefaultKeyMaker(),
+        lock_ttl=settings.CACHE_LOCK_TTL if settings.CACHE_LOCK_ENABLED else None,
+        lock_wait=settings.CACHE_LOCK_WAIT,
+        ttl_jitter=settings.CACHE_TTL_JITTER,
+        negative_ttl=settings.CACHE_NEGATIVE_TTL,
+        tag_ttl=settings.CACHE_TAG_TTL,
+        # Background refreshes, and misses whose first caller was cancelled, outlive the request that started them,
+        # so they get their own session.
+        background_scope=session_scope(Dialect.POSTGRES),
+    )
 
 
 def init_sentry() -> None:
@@ -63,13 +100,14 @@ def make_middleware() -> list[Middleware]:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],
         ),
         Middleware(SQLAlchemyMiddleware),
     ]
     return middleware
 
 
-def on_startup(app: FastAPI):
+async def on_startup(app: FastAPI):
     """
     Executed before application starts taking requests, during the startup.
     """
@@ -77,18 +115,26 @@ def on_startup(app: FastAPI):
     # Load logger
     import core.logger  # noqa: F401
 
+    # The cache connection pool is bound to the running event loop, so it is created here.
+    init_cache()
+    DB_MANAGER[Dialect.POSTGRES].start()
+
 
-def on_shutdown(app: FastAPI):
+async def on_shutdown(app: FastAPI):
     """
     Executed after application finishes handling requests, right before the shutdown.
     """
+    await Cache.close()
+    for db_session_keeper in DB_MANAGER.values():
+        await db_session_keeper.close()
+    await ENGINES.dispose()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    on_startup(app)
+    await on_startup(app)
     yield
-    on_shutdown(app)
+    await on_shutdown(app)
 
 
 def create_machine() -> FastAPI:
@@ -113,7 +159,6 @@ def create_machine() -> FastAPI:
     app_.settings = settings
     init_routers(app_)
     init_listeners(app_=app_)
-    init_cache()
     init_sentry()
     return app_
 